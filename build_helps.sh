@@ -2,4 +2,14 @@
 python3 falmeida-py-runner.py -h &> docs/help_message.txt
 python3 falmeida-py-runner.py tsv2markdown -h &> docs/tsv2markdown_help.txt
 python3 falmeida-py-runner.py splitgbk -h &> docs/splitgbk_help.txt
-python3 falmeida-py-runner.py align2subsetgbk -h &> docs/align2subsetgbk_help.txt
\ No newline at end of file
+python3 falmeida-py-runner.py fetchgbk -h &> docs/fetchgbk_help.txt
+python3 falmeida-py-runner.py align2subsetgbk -h &> docs/align2subsetgbk_help.txt
+python3 falmeida-py-runner.py indexgbk -h &> docs/indexgbk_help.txt
+python3 falmeida-py-runner.py gbkflanks -h &> docs/gbkflanks_help.txt
+python3 falmeida-py-runner.py gbkconvert -h &> docs/gbkconvert_help.txt
+python3 falmeida-py-runner.py gbkstats -h &> docs/gbkstats_help.txt
+python3 falmeida-py-runner.py gbk2table -h &> docs/gbk2table_help.txt
+python3 falmeida-py-runner.py fastaindex -h &> docs/fastaindex_help.txt
+python3 falmeida-py-runner.py getfasta -h &> docs/getfasta_help.txt
+python3 falmeida-py-runner.py maskfasta -h &> docs/maskfasta_help.txt
+python3 falmeida-py-runner.py seqstats -h &> docs/seqstats_help.txt
\ No newline at end of file
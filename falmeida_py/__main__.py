@@ -31,10 +31,20 @@ options:
 commands:
     tsv2markdown               Command for rapid convertion of tsv or csv to markdown tables.
     splitgbk                   Command to split multisequence genbank files into individual files.
+    fetchgbk                   Command to fetch records from multisequence genbank files using a byte-offset index.
     align2subsetgbk            Command to subset genbank files based on alignments to a FASTA file.
     gbk2fasta                  Command to convert genbank files to fasta files.
+    indexgbk                   Command to index the genes of many genbank files by locus_tag.
+    gbkflanks                  Command to extract the upstream and/or downstream flanking regions of CDSs.
+    gbkconvert                 Command to convert a genbank file into proteins, genes, genome, GFF3 and BED files at once.
+    gbkstats                   Command to quickly summarize (QC) many genbank files into a TSV.
+    gbk2table                  Command to export the features of genbank files as a Parquet or Arrow dataset.
     blasts                     Command to execute automatized blast commands.
     replace_fasta_seq          Command to replace strings in a FASTA using defitinitions from a BED file
+    fastaindex                 Command to index a FASTA file (.fai), compatible with samtools faidx.
+    getfasta                   Command to extract the sequences of BED intervals from a FASTA file.
+    maskfasta                  Command to soft-mask or hard-mask the intervals of a BED file in a FASTA file.
+    seqstats                   Command to quickly compute assembly statistics of FASTA or genbank files into a CSV file
     mpgap2csv                  Command to summarize main mpgap multiqc assembly statistics into a CSV file
     bacannot2json              Command to summarize main bacannot annotation results into JSON file
 
@@ -58,6 +68,16 @@ from .align2subsetgbk import *
 from .replace_fasta_seq import *
 from .bacannot2json import usage_bacannot2json,bacannot2json
 from .mpgap2csv import usage_mpgap2csv,mpgap2csv
+from .seqstats import usage_seqstats,seqstats
+from .fetchgbk import usage_fetchgbk,fetchgbk
+from .indexgbk import usage_indexgbk,indexgbk,convertindex
+from .gbk2table import usage_gbk2table,gbk2table
+from .gbkstats import usage_gbkstats,gbkstats
+from .gbkconvert import usage_gbkconvert,gbkconvert
+from .gbkflanks import usage_gbkflanks,gbkflanks
+from .fastaindex import usage_fastaindex,fastaindex,usage_getfasta,getfasta
+from .maskfasta import usage_maskfasta,maskfasta
+from .utils import find_gbk_files
 
 ## Defining main
 def main():
@@ -97,12 +117,35 @@ def main():
         if args['--help']:
             print(usage_splitgbk.strip())
 
+        elif args['--gbk'] and (args['--records-per-chunk'] or args['--bytes-per-chunk']):
+            splitgbk_chunks(args['--gbk'], args['--outdir'], args['--records-per-chunk'], args['--bytes-per-chunk'])
+
+        elif args['--gbk'] and args['--archive']:
+            splitgbk_archive(args['--gbk'], args['--archive'], args['--validate'])
+
         elif args['--gbk']:
-            splitgbk(args['--gbk'], args['--outdir'])
+            splitgbk(args['--gbk'], args['--outdir'], args['--validate'])
 
         else:
             print(usage_splitgbk.strip())
 
+    #########################
+    ### Fetch gbk command ###
+    #########################
+    elif arguments['<command>'] == 'fetchgbk':
+        # Parse docopt
+        args = docopt(usage_fetchgbk, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_fetchgbk.strip())
+
+        elif args['--gbk'] and (args['<id>'] or args['--fofn']):
+            fetchgbk(args['--gbk'], args['<id>'], args['--out'], args['--fofn'], args['--reindex'])
+
+        else:
+            print(usage_fetchgbk.strip())
+
     ######################
     ### Blast commands ###
     ######################
@@ -142,18 +185,33 @@ def main():
         if args['--help']:
             print(usage_align2subsetgbk.strip())
 
+        elif args['--gbk'] and (args['--region'] or args['--bed']):
+
+            # Run
+            print(f"Processing file: {args['--gbk']}!")
+            regiongbk(gbk=args['--gbk'], out=args['--out'], regions=args['--region'], bed=args['--bed'],
+            extension=int(args['--extension']), slice=args['--slice'])
+
         elif args['--gbk'] and args['--fasta']:
 
             # Run
             print(f"Processing file: {args['--gbk']}!")
-            gbk2fasta(gbk=args['--gbk'])
-            blast(task='blastn', query=args['--fasta'], subject='tmp_gbk.fa',
-            culling=args['--culling_limit'], minid=args['--minid'], mincov=args['--mincov'],
-            out='out.blast', threads=1, twoway=None)
-            filtergbk(gbk=args['--gbk'], out=args['--out'], extension=int(args['--extension']))
+            align2subsetgbk(gbk=args['--gbk'], fasta=args['--fasta'], out=args['--out'],
+            minid=args['--minid'], mincov=args['--mincov'], culling=args['--culling_limit'],
+            extension=int(args['--extension']), threads=args['--threads'], biopython=args['--biopython'],
+            cache_dir=args['--cache-dir'], cache_size=args['--cache-size'])
+
+        elif args['--gbk-list'] and args['--fasta']:
 
-            # Clean dir
-            os.system(f"rm -rf tmp_gbk.fa out.blast")
+            # Run
+            print(f"Processing files in: {args['--gbk-list']}!")
+            try:
+                align2subsetgbk_batch(gbk_list=args['--gbk-list'], fasta=args['--fasta'], outdir=args['--outdir'],
+                minid=args['--minid'], mincov=args['--mincov'], culling=args['--culling_limit'],
+                extension=int(args['--extension']), threads=args['--threads'], biopython=args['--biopython'],
+                cache_dir=args['--cache-dir'], cache_size=args['--cache-size'])
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
 
         else:
             print(usage_align2subsetgbk.strip())
@@ -173,12 +231,84 @@ def main():
 
             # Run
             print(f"Processing file: {args['--fasta']}!")
-            replace_fasta_seq(input=args['--fasta'], bed=args['--bed'], output=args['--out'])
-            print(f"Done!")
+            try:
+                replace_fasta_seq(input=args['--fasta'], bed=args['--bed'], output=args['--out'], stream=args['--stream'])
+                print("Done!")
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
+
+        elif args['--fasta'] and args['--manifest']:
+
+            # Run
+            print(f"Processing file: {args['--fasta']}!")
+            try:
+                replace_fasta_seq_batch(input=args['--fasta'], manifest=args['--manifest'], jobs=args['--jobs'])
+                print("Done!")
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
 
         else:
             print(usage_replace_fasta_seq.strip())
     
+    ##########################
+    ### fastaindex command ###
+    ##########################
+    elif arguments['<command>'] == 'fastaindex':
+        # Parse docopt
+        args = docopt(usage_fastaindex, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_fastaindex.strip())
+
+        elif args['--fasta']:
+            fastaindex(fasta=args['--fasta'])
+
+        else:
+            print(usage_fastaindex.strip())
+
+    ########################
+    ### getfasta command ###
+    ########################
+    elif arguments['<command>'] == 'getfasta':
+        # Parse docopt
+        args = docopt(usage_getfasta, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_getfasta.strip())
+
+        elif args['--fasta'] and args['--bed']:
+            try:
+                getfasta(fasta=args['--fasta'], bed=args['--bed'], out=args['--out'], strand=args['--strand'],
+                name=args['--name'], jobs=args['--jobs'])
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
+
+        else:
+            print(usage_getfasta.strip())
+
+    #########################
+    ### maskfasta command ###
+    #########################
+    elif arguments['<command>'] == 'maskfasta':
+        # Parse docopt
+        args = docopt(usage_maskfasta, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_maskfasta.strip())
+
+        elif args['--fasta'] and args['--bed']:
+
+            # Run
+            print(f"Processing file: {args['--fasta']}!")
+            maskfasta(fasta=args['--fasta'], bed=args['--bed'], out=args['--out'], hard=args['--hard'])
+            print("Done!")
+
+        else:
+            print(usage_maskfasta.strip())
+
     ###########################
     ### Convert gbk 2 fasta ###
     ###########################
@@ -191,10 +321,162 @@ def main():
             print(usage_gbk2fasta.strip())
 
         elif args['--gbk']:
-            convertgbk(genbank=args['--gbk'], genes_list=args['--fofn'])
+
+            ## check if type is correct
+            if args['--type'].lower() not in ['nucl', 'prot']:
+                print(f"PROBLEM!\nI could not understand the type \"{args['--type'].lower()}\", please select one of: nucl or prot.")
+
+            ## deduplication needs a single output
+            elif args['--dedup'] and args['--outdir']:
+                print("PROBLEM!\nThe --dedup option cannot be used with --outdir, please write a single fasta with --out.")
+
+            else:
+                try:
+                    ## a single genome
+                    if find_gbk_files(args['--gbk']) == [args['--gbk']] and not args['--outdir']:
+                        convertgbk(genbank=args['--gbk'], genes_list=args['--fofn'], out=args['--out'],
+                        seq_type=args['--type'].lower(), dedup=args['--dedup'], biopython=args['--biopython'],
+                        cache_dir=args['--cache-dir'], cache_size=args['--cache-size'])
+
+                    ## multiple genomes
+                    else:
+                        convertgbks(genbanks=args['--gbk'], genes_list=args['--fofn'], out=args['--out'],
+                        outdir=args['--outdir'], seq_type=args['--type'].lower(), dedup=args['--dedup'],
+                        jobs=args['--jobs'], biopython=args['--biopython'], cache_dir=args['--cache-dir'],
+                        cache_size=args['--cache-size'])
+                except ValueError as error:
+                    print(f"PROBLEM!\n{error}")
+
+        elif args['--index'] and args['--fofn']:
+
+            ## check if type is correct
+            if args['--type'].lower() in ['nucl', 'prot']:
+                try:
+                    convertindex(db=args['--index'], genes_list=args['--fofn'], out=args['--out'],
+                    seq_type=args['--type'].lower(), dedup=args['--dedup'])
+                except ValueError as error:
+                    print(f"PROBLEM!\n{error}")
+            else:
+                print(f"PROBLEM!\nI could not understand the type \"{args['--type'].lower()}\", please select one of: nucl or prot.")
 
         else:
             print(usage_gbk2fasta.strip())
+
+    ########################
+    ### indexgbk command ###
+    ########################
+    elif arguments['<command>'] == 'indexgbk':
+        # Parse docopt
+        args = docopt(usage_indexgbk, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_indexgbk.strip())
+
+        elif args['--gbk']:
+            try:
+                indexgbk(genbanks=args['--gbk'], db=args['--index'], jobs=args['--jobs'])
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
+
+        else:
+            print(usage_indexgbk.strip())
+
+    #########################
+    ### gbkflanks command ###
+    #########################
+    elif arguments['<command>'] == 'gbkflanks':
+        # Parse docopt
+        args = docopt(usage_gbkflanks, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_gbkflanks.strip())
+
+        elif args['--gbk']:
+            try:
+                ## check the flank lengths
+                upstream, downstream = int(args['--upstream']), int(args['--downstream'])
+                if upstream < 0 or downstream < 0:
+                    raise ValueError
+            except ValueError:
+                print(f"PROBLEM!\nThe --upstream and --downstream lengths must be non-negative integers, not \"{args['--upstream']}\" and \"{args['--downstream']}\".")
+            else:
+                if upstream == 0 and downstream == 0:
+                    print(usage_gbkflanks.strip())
+                else:
+                    try:
+                        gbkflanks(genbanks=args['--gbk'], out=args['--out'], genes_list=args['--fofn'],
+                        upstream=upstream, downstream=downstream, biopython=args['--biopython'])
+                    except ValueError as error:
+                        print(f"PROBLEM!\n{error}")
+
+        else:
+            print(usage_gbkflanks.strip())
+
+    ##########################
+    ### gbkconvert command ###
+    ##########################
+    elif arguments['<command>'] == 'gbkconvert':
+        # Parse docopt
+        args = docopt(usage_gbkconvert, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_gbkconvert.strip())
+
+        elif args['--gbk'] and any(args[output] for output in ['--faa', '--ffn', '--fna', '--gff3', '--bed']):
+            gbkconvert(genbank=args['--gbk'], faa=args['--faa'], ffn=args['--ffn'], fna=args['--fna'],
+            gff3=args['--gff3'], bed=args['--bed'], biopython=args['--biopython'])
+
+        else:
+            print(usage_gbkconvert.strip())
+
+    ########################
+    ### gbkstats command ###
+    ########################
+    elif arguments['<command>'] == 'gbkstats':
+        # Parse docopt
+        args = docopt(usage_gbkstats, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_gbkstats.strip())
+
+        elif args['--gbk']:
+            try:
+                gbkstats(genbanks=args['--gbk'], out=args['--out'], jobs=args['--jobs'])
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
+
+        else:
+            print(usage_gbkstats.strip())
+
+    #########################
+    ### gbk2table command ###
+    #########################
+    elif arguments['<command>'] == 'gbk2table':
+        # Parse docopt
+        args = docopt(usage_gbk2table, version=__version__, help=False)
+
+        # Run
+        if args['--help']:
+            print(usage_gbk2table.strip())
+
+        elif args['--gbk']:
+
+            ## check if format is correct
+            if args['--format'].lower() in ['parquet', 'arrow']:
+                try:
+                    gbk2table(genbanks=args['--gbk'], outdir=args['--outdir'], file_format=args['--format'].lower(),
+                    all_qualifiers=args['--all-qualifiers'], jobs=args['--jobs'], biopython=args['--biopython'])
+                except ValueError as error:
+                    print(f"PROBLEM!\n{error}")
+            else:
+                print(f"PROBLEM!\nI could not understand the format \"{args['--format'].lower()}\", please select one of: parquet or arrow.")
+
+        else:
+            print(usage_gbk2table.strip())
     
     #############################
     ### bacannot2json command ###
@@ -232,6 +514,27 @@ def main():
         else:
             print(usage_mpgap2csv.strip())
 
+    ########################
+    ### seqstats command ###
+    ########################
+    elif arguments['<command>'] == 'seqstats':
+
+        # Parse docopt
+        args = docopt(usage_seqstats, version=__version__, help=False)
+
+        # run script
+        if args['--help']:
+            print(usage_seqstats.strip())
+
+        elif args['--input']:
+            try:
+                seqstats(args['--input'], args['--output'], args['--jobs'])
+            except ValueError as error:
+                print(f"PROBLEM!\n{error}")
+
+        else:
+            print(usage_seqstats.strip())
+
     #####################
     ### Check license ###
     #####################
@@ -13,68 +13,328 @@ License: Public Domain
 
 Usage:
     falmeida-py align2subsetgbk [ -h|--help ]
-    falmeida-py align2subsetgbk [ --gbk <in_gbk> --fasta <fasta> --out <out_gbk> --minid <int> --mincov <int> --culling_limit <int> --extension <int> ]
+    falmeida-py align2subsetgbk [ --gbk <in_gbk> --gbk-list <list> --fasta <fasta> --out <out_gbk> --outdir <outdir> --minid <int> --mincov <int> --culling_limit <int> --extension <int> --threads <int> --biopython --cache-dir <dir> --cache-size <size> ]
+    falmeida-py align2subsetgbk [ --gbk <in_gbk> --out <out_gbk> --extension <int> --bed <bed> --slice ] [ --region <region> ]...
 
 Options:
     -h --help                      Show this screen.
     -g --gbk=<in_gbk>              Gbk file for subset
+    --gbk-list=<list>              Directory of gbk files, or file listing one gbk path per line, to subset in batch.
     -f --fasta=<fasta>             FASTA (nucl) file for querying the gbk
     -o --out=<out_gbk>             Gbk filtered output file [Default: out.gbk].
+    --outdir=<outdir>              Directory (must already exist) to write the batch subsets as <name>.subset.gbk [Default: ./].
     --extension=<int>              Base pair length to extend the flank regions in the alignment [Default: 0].
     --minid=<int>                  Min. Identity percentage for gene annotation [Default: 80].
     --mincov=<int>                 Min. Covereage for gene annotation [Default: 80].
     --culling_limit=<int>          Blast culling_limit for best hit only [Default: 1].
+    -t --threads=<int>             Number of threads for blast, and of parallel processes in batch mode [Default: 1].
+    --biopython                    Read the contig sequences with Biopython instead of the built-in lightweight parser.
+    --cache-dir=<dir>              Directory to cache parsed gbk files, so later runs on the same files skip parsing.
+    --cache-size=<size>            Maximum size of the cache, least recently used files are evicted first [Default: 5G].
+    -r --region=<region>           Subset by known coordinates instead of alignments: contig:start-end (1-based, inclusive).
+                                   Can be given multiple times.
+    -b --bed=<bed>                 Subset by the known coordinates of a BED file instead of alignments.
+    --slice                        In region mode, write the region sub-records (features clipped to the region)
+                                   instead of the whole records.
+
+Comments:
+    In batch mode (--gbk-list) the subject databases are built in parallel and searched with a
+    single blastn run. The culling limit is then applied separately for each genome.
+
+    In region mode (--region and/or --bed) no alignment is made: features overlapping the regions,
+    extended by --extension, are selected with a per-record interval index in a single parse.
 """
 
 ##################################
 ### Loading Necessary Packages ###
 ##################################
-from docopt import docopt
 from Bio import SeqIO
-import pandas as pd
+from Bio.SeqFeature import SeqFeature, FeatureLocation, CompoundLocation, BeforePosition, AfterPosition, ExactPosition
 from .blasts import *
+from .fetchgbk import load_gbk_index, read_gbk_record
+from .utils import find_gbk_files
+from .gbkparser import parse_gbk, parse_gbk_bytes
+from .gbk2fasta import feature_parts
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import subprocess
+import tempfile
+import sys
+import os
+import io
 
 ##########################################
 ### Function to convert gbk into fasta ###
 ##########################################
-def gbk2fasta(gbk):
-    f=open("tmp_gbk.fa", "a")
-    for seq_record in SeqIO.parse(gbk, 'genbank'):
-        print(f">{seq_record.id}\n{seq_record.seq}\n", file=f)
+def gbk2fasta(gbk, biopython=False, cache_dir=None, cache_size='5G'):
+    """
+    Yields the (id, sequence) of the records of a gbk file, skipping records without
+    sequence (no ORIGIN section, e.g. CONTIG records), which cannot be searched.
+    """
+    skipped = []
+    if biopython:
+        for seq_record in SeqIO.parse(gbk, 'genbank'):
+            if seq_record.seq.defined:
+                yield seq_record.id, seq_record.seq
+            else:
+                skipped.append(seq_record.id)
+    else:
+        for seq_record in parse_gbk(gbk, True, cache_dir, cache_size):
+            if seq_record.seq is not None:
+                yield seq_record.id, seq_record.seq.decode()
+            else:
+                skipped.append(seq_record.id)
+    if skipped:
+        print(f"WARNING: records without sequence in {gbk} were not searched: {', '.join(skipped)}", file=sys.stderr)
+
+########################################################
+### Functions to select features overlapping windows ###
+########################################################
+def merge_windows(windows):
+    """
+    Merges overlapping (or touching) [start, end] windows into a sorted list of disjoint windows.
+    """
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def feature_spans(features):
+    """
+    Returns the (start, end, index) of the located (non-source) features, sorted by start.
+    Works with both lightweight and Biopython features.
+    """
+    spans = []
+    for i, feature in enumerate(features):
+        parts = feature_parts(feature)
+        if feature.type != "source" and parts:
+            spans.append((min(start for start, _, _ in parts), max(end for _, end, _ in parts), i))
+    return sorted(spans)
+
+def select_features(features, windows):
+    """
+    Returns the (non-source) features that start inside any of the windows, each one only
+    once and in their original order, using binary searches over the sorted feature starts.
+    """
+    index = [(start, i) for start, _, i in feature_spans(features)]
+    starts = [start for start, i in index]
+    selected = set()
+    for start, end in merge_windows(windows):
+        selected.update(i for _, i in index[bisect_left(starts, start):bisect_right(starts, end)])
+    return [features[i] for i in sorted(selected)]
+
+def overlapping_features(features, windows):
+    """
+    Returns the (non-source) features overlapping any of the 0-based, half-open windows, in their
+    original order. Features are indexed by start along with the longest feature length, so only
+    those starting up to that length before a window need to be checked.
+    """
+    index = feature_spans(features)
+    starts = [start for start, _, _ in index]
+    longest = max((end - start for start, end, _ in index), default=0)
+    selected = set()
+    for start, end in merge_windows(windows):
+        selected.update(i for _, feature_end, i in index[bisect_left(starts, start - longest):bisect_left(starts, end)] if feature_end > start)
+    return [features[i] for i in sorted(selected)]
+
+def clip_feature(feature, start, end):
+    """
+    Returns a copy of a feature clipped to the [start, end) window, in window coordinates, or None
+    when none of its parts overlap the window. Clipped ends are marked as partial (<, >), the
+    translation of clipped features is dropped and codon_start follows the bases clipped at 5'.
+    """
+    parts, clipped = [], 0
+    for part in feature.location.parts:
+        part_start, part_end = max(int(part.start), start), min(int(part.end), end)
+        if part_start >= part_end:
+            # bases (in biological order) before the first kept one shift the reading frame
+            clipped += len(part) if not parts else 0
+            continue
+        if not parts:
+            clipped += part_start - int(part.start) if part.strand != -1 else int(part.end) - part_end
+        partial = feature.type != "source"
+        parts.append(FeatureLocation(
+            BeforePosition(part_start - start) if partial and part_start > int(part.start) else ExactPosition(part_start - start),
+            AfterPosition(part_end - start) if partial and part_end < int(part.end) else ExactPosition(part_end - start),
+            part.strand
+        ))
+    if not parts:
+        return None
+    qualifiers = dict(feature.qualifiers)
+    if int(feature.location.start) < start or int(feature.location.end) > end:
+        qualifiers.pop("translation", None)
+    if clipped and (feature.type == "CDS" or "codon_start" in qualifiers):
+        codon_start = int(qualifiers.get("codon_start", ["1"])[0])
+        qualifiers["codon_start"] = [str((codon_start - 1 - clipped) % 3 + 1)]
+    return SeqFeature(parts[0] if len(parts) == 1 else CompoundLocation(parts), type=feature.type, qualifiers=qualifiers)
+
+###########################################
+### Write records with a feature subset ###
+###########################################
+def write_subset_record(handle, data, record, features):
+    """
+    Writes a record (parsed from its raw bytes, data) keeping only the given features. The
+    header, the feature blocks and the tail (sequence) are copied from the original bytes.
+    """
+    assert all(feature.block is not None for feature in features), "features loaded from the parse cache have no raw bytes"
+    first_feature = record.features[0].offset if record.features else record.tail_offset
+    handle.write(data[:first_feature])
+    handle.write(b''.join(feature.block for feature in features))
+    handle.write(data[record.tail_offset:])
 
 ############################################
 ### Function to filter gbk based on hits ###
 ############################################
-def filtergbk(gbk, out, extension):
+def filtergbk(gbk, out, extension, blast_res):
 
-    f=open(f"{out}", "w")
-    # Read blast results
-    blast_res = pd.read_csv('out.blast', sep = '\t')
+    # Show blast results
     print(blast_res)
 
-    # Get locus_tags
-    contigs = sorted(set(blast_res["sseqid"].tolist()))
+    # Hit windows, regardless of the strand, extended by the flanks
+    blast_res["wstart"] = blast_res[["sstart", "send"]].min(axis=1) - extension
+    blast_res["wend"] = blast_res[["sstart", "send"]].max(axis=1) + extension
 
-    # Subset
-    for contig in contigs:
-        for seq_record in SeqIO.parse(gbk, 'genbank'):
-            if str(contig) == str(seq_record.id):
-                filtered = []
-                small_df = blast_res[blast_res['sseqid'].isin([seq_record.id])]
-                for index, row in small_df.iterrows():
-                    for features in seq_record.features:
-                        # plus strand
-                        if int(row["sstart"]) <= int(row["send"]):
-                            if int(features.location.start) >= int(row["sstart"] - extension) and int(features.location.start) <= int(row["send"] + extension) and features.type != "source":
-                                filtered.append(features)
-                        # minus strand
-                        elif int(row["sstart"]) >= int(row["send"]):
-                            if int(features.location.start) >= int(row["send"] - extension) and int(features.location.start) <= int(row["sstart"] + extension) and features.type != "source":
-                                filtered.append(features)
-
-                # Print results
-                seq_record.features = filtered
-                if len(seq_record.features) > 0:
-                    SeqIO.write(seq_record, f, 'gb')
-            else:
-                pass
+    # Subset, only reading the records with hits
+    index = load_gbk_index(gbk)
+    with open(gbk, 'rb') as handle, open(out, 'wb') as f:
+        for contig, hits in blast_res.groupby("sseqid"):
+            if str(contig) not in index:
+                continue
+            data = read_gbk_record(handle, index[str(contig)])
+            seq_record = next(parse_gbk_bytes(data))
+            features = select_features(seq_record.features, zip(hits["wstart"], hits["wend"]))
+
+            # Print results
+            if len(features) > 0:
+                write_subset_record(f, data, seq_record, features)
+
+###################################################
+### Function to filter gbk based on coordinates ###
+###################################################
+def load_regions(regions=[], bed=None):
+    """
+    Reads contig:start-end (1-based, inclusive) strings and BED lines into a dict of
+    0-based, half-open windows per contig.
+    """
+    windows = {}
+    for region in regions:
+        contig, _, coords = region.rpartition(':')
+        start, end = coords.replace(',', '').split('-')
+        windows.setdefault(contig, []).append((int(start) - 1, int(end)))
+    if bed:
+        with open(bed) as f:
+            for line in f:
+                fields = line.split('\t')
+                if len(fields) < 3 or line.startswith(('#', 'track', 'browser')):
+                    continue
+                windows.setdefault(fields[0], []).append((int(fields[1]), int(fields[2])))
+    return windows
+
+def regiongbk(gbk, out, regions=[], bed=None, extension=0, slice=False):
+    windows = load_regions(regions, bed)
+
+    # only the records with regions are read, in file order
+    index = load_gbk_index(gbk)
+    missing = [contig for contig in windows if contig not in index]
+    if missing:
+        print(f"WARNING: records not found in {gbk}: {', '.join(missing)}", file=sys.stderr)
+    contigs = sorted((contig for contig in windows if contig in index), key=lambda contig: index[contig])
+
+    with open(gbk, 'rb') as handle, open(out, 'wb' if not slice else 'w') as f:
+        for contig in contigs:
+            data = read_gbk_record(handle, index[contig])
+
+            # whole record with the overlapping features
+            if not slice:
+                seq_record = next(parse_gbk_bytes(data))
+                length = seq_record.length or max((end for _, end, _ in feature_spans(seq_record.features)), default=0)
+                features = overlapping_features(seq_record.features, [(max(0, start - extension), min(length, end + extension)) for start, end in windows[contig]])
+                if len(features) > 0:
+                    write_subset_record(f, data, seq_record, features)
+                continue
+
+            # one sub-record per (merged) region, regenerated by Biopython
+            seq_record = SeqIO.read(io.StringIO(data.decode()), 'genbank')
+            extended = [(max(0, start - extension), min(len(seq_record), end + extension)) for start, end in windows[contig]]
+            sources = [feature for feature in seq_record.features if feature.type == "source"]
+            for start, end in merge_windows(extended):
+                sub_record = seq_record[start:end]
+                sub_record.id = f"{seq_record.id}:{start + 1}-{end}"
+                sub_record.annotations = dict(seq_record.annotations)
+                clipped = (clip_feature(feature, start, end) for feature in sources + overlapping_features(seq_record.features, [(start, end)]))
+                sub_record.features = [feature for feature in clipped if feature is not None]
+                SeqIO.write(sub_record, f, 'gb')
+
+#####################
+### main function ###
+#####################
+def align2subsetgbk(gbk, fasta, out, minid, mincov, culling, extension, threads=1, biopython=False, cache_dir=None, cache_size='5G'):
+
+    # private workspace, so concurrent runs never share scratch files
+    with tempfile.TemporaryDirectory(prefix='falmeida-py-') as workdir:
+        db = os.path.join(workdir, 'FA-PY-SUBJECT-DB')
+        makeblastdb(gbk2fasta(gbk, biopython, cache_dir, cache_size), db, 'nucl')
+        blast_res = blast_hits(task='blastn', query=fasta, db=db, culling=culling,
+        minid=minid, mincov=mincov, threads=threads, twoway=None)
+
+    filtergbk(gbk=gbk, out=out, extension=extension, blast_res=blast_res)
+
+##################
+### batch mode ###
+##################
+def genome_blastdb(prefix, gbk, db, biopython=False, cache_dir=None, cache_size='5G'):
+    """
+    Worker function building the database of a genome. Returns a problem, if any.
+    """
+    try:
+        # contigs are prefixed so hits can be traced back to their genome
+        makeblastdb(((f"{prefix}__{rec_id}", seq) for rec_id, seq in gbk2fasta(gbk, biopython, cache_dir, cache_size)), db, 'nucl')
+    except (ValueError, OSError, subprocess.CalledProcessError) as error:
+        return f"{gbk}: {error}"
+
+def genome_subset(gbk, out, extension, hits):
+    """
+    Worker function writing the subset of a genome. Returns a problem, if any.
+    """
+    try:
+        filtergbk(gbk, out, extension, hits)
+    except (ValueError, OSError) as error:
+        return f"{gbk}: {error}"
+
+def align2subsetgbk_batch(gbk_list, fasta, outdir, minid, mincov, culling, extension, threads=1, biopython=False, cache_dir=None, cache_size='5G'):
+
+    gbks = find_gbk_files(gbk_list)
+    names = [Path(gbk).stem for gbk in gbks]
+    duplicated = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicated:
+        raise ValueError(f"Different gbk files would write the same subsets (<name>.subset.gbk), rename them: {', '.join(duplicated)}")
+    outs = [os.path.join(outdir, f"{name}.subset.gbk") for name in names]
+
+    with tempfile.TemporaryDirectory(prefix='falmeida-py-') as workdir, ProcessPoolExecutor(max_workers=int(threads)) as pool:
+        # one database per genome, built in parallel; a failing genome does not stop the others
+        dbs = [os.path.join(workdir, f"FA-PY-SUBJECT-DB-{n}") for n in range(len(gbks))]
+        n = len(gbks)
+        problems = list(pool.map(genome_blastdb, range(n), gbks, dbs, [biopython] * n, [cache_dir] * n, [cache_size] * n))
+        genomes = [n for n, problem in enumerate(problems) if not problem]
+        problems = [problem for problem in problems if problem]
+        if not genomes:
+            raise ValueError('\n'.join(problems))
+
+        # a single search against all of them, culling is done per genome afterwards
+        blast_res = blast_hits(task='blastn', query=fasta, db=[dbs[n] for n in genomes], culling=None,
+        minid=minid, mincov=mincov, threads=threads, twoway=None, max_target_seqs=1000000)
+
+    # demultiplex hits back to their genomes
+    genome_ids = blast_res["sseqid"].str.split("__", n=1).str[0].astype(int)
+    blast_res["sseqid"] = blast_res["sseqid"].str.split("__", n=1).str[1]
+    blast_res = cull_hits(blast_res.assign(genome=genome_ids), culling, ["genome", "qseqid"])
+    hits = [blast_res[blast_res["genome"] == n].drop(columns="genome") for n in genomes]
+
+    with ProcessPoolExecutor(max_workers=int(threads)) as pool:
+        problems += [problem for problem in pool.map(genome_subset, [gbks[n] for n in genomes], [outs[n] for n in genomes], [extension] * len(genomes), hits) if problem]
+    if problems:
+        raise ValueError('\n'.join(problems))
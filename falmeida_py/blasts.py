@@ -35,8 +35,15 @@ Options:
 ### Loading Necessary Packages ###
 ##################################
 import pandas as pd
+import subprocess
 import os
 
+# Columns of the tabular output used by the functions below
+blast_columns = [
+    "qseqid", "qstart", "qend", "qlen", "sseqid", "sstart", "send",
+    "slen", "evalue", "length", "pident", "gaps", "gapopen", "bitscore"
+]
+
 ######################
 ### BLAST FUNCTION ###
 ######################
@@ -66,6 +73,69 @@ def blast(task, query, subject, culling, minid, mincov, out, threads, twoway):
     # clear work dir
     os.system("rm -rf ./FA-PY-SUBJECT-DB*")
 
+###############################################
+### Make blast db from an iterable of seqs ###
+###############################################
+def makeblastdb(sequences, db, db_type):
+    """
+    Builds a blast database at `db` piping (id, sequence) pairs straight into makeblastdb stdin.
+    """
+    proc = subprocess.Popen(
+        ["makeblastdb", "-in", "-", "-title", os.path.basename(db), "-out", db, "-dbtype", db_type],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+    )
+    for seq_id, seq in sequences:
+        proc.stdin.write(f">{seq_id}\n{seq}\n".encode())
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, "makeblastdb")
+
+###################################################
+### Run blast and load filtered hits from pipe ###
+###################################################
+def blast_hits(task, query, db, culling, minid, mincov, threads, twoway, max_target_seqs=None):
+    """
+    Runs blast against existing database(s) and returns its filtered hits as a data frame,
+    reading the tabular output directly from the process pipe. Several databases can be
+    searched at once by giving a list. Culling is disabled when `culling` is None.
+    """
+    outfmt = "6 " + " ".join(blast_columns)
+    # blast splits -db on spaces, so each path is quoted in case it has any
+    dbs = [db] if isinstance(db, str) else db
+    cmd = [task, "-query", query, "-db", " ".join(f'"{path}"' for path in dbs), "-outfmt", outfmt, "-num_threads", str(threads)]
+    if culling is not None:
+        cmd += ["-culling_limit", str(culling)]
+    if max_target_seqs is not None:
+        cmd += ["-max_target_seqs", str(max_target_seqs)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    hits = pd.read_csv(proc.stdout, sep="\t", names=blast_columns, dtype={"qseqid": str, "sseqid": str})
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, task)
+
+    # same filters as in the blast function
+    aligned = 100 * (hits["length"] - hits["gaps"])
+    keep = (hits["pident"] >= float(minid)) & (aligned / hits["qlen"] >= float(mincov))
+    if twoway:
+        keep &= aligned / hits["slen"] >= float(mincov)
+    return hits[keep].reset_index(drop=True)
+
+#####################################
+### Culling of hits within groups ###
+#####################################
+def cull_hits(hits, culling, groups):
+    """
+    Mimics blast -culling_limit inside each group of hits (e.g. per query and subject genome):
+    a hit is dropped when its query range is enveloped by at least `culling` higher-scoring hits.
+    """
+    keep = []
+    for _, group in hits.sort_values("bitscore", ascending=False, kind="stable").groupby(groups, sort=False):
+        seen = []
+        for idx, qstart, qend in zip(group.index, group[["qstart", "qend"]].min(axis=1), group[["qstart", "qend"]].max(axis=1)):
+            if sum(1 for start, end in seen if start <= qstart and qend <= end) < int(culling):
+                keep.append(idx)
+                seen.append((qstart, qend))
+    return hits.loc[sorted(keep)]
+
 ########################
 ### Summary function ###
 ########################
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_fastaindex = """
+A script meant to index a FASTA file (.fai), compatible with samtools faidx.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py fastaindex [ -h|--help ]
+    falmeida-py fastaindex [ --fasta <fasta> ]
+
+Options:
+    -h --help                      Show this screen.
+    -f --fasta=<fasta>             FASTA file to index as <fasta>.fai.
+
+Comments:
+    Each line of the index has the columns: name, length, offset of the first base, bases per line
+    and bytes per line. All the lines of a sequence, but the last, must have the same length.
+"""
+
+usage_getfasta = """
+A script meant to extract the sequences of BED intervals from an (indexed) FASTA file.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py getfasta [ -h|--help ]
+    falmeida-py getfasta [ --fasta <fasta> --bed <bed> --out <out_fasta> --strand --name --jobs <int> ]
+
+Options:
+    -h --help                      Show this screen.
+    -f --fasta=<fasta>             FASTA file to extract sequences from. It is indexed (<fasta>.fai) when needed.
+    -b --bed=<bed>                 BED file (start 0-based) with the intervals to extract.
+    -o --out=<out_fasta>           Output FASTA file [Default: stdout].
+    -s --strand                    Reverse complement the intervals on the minus strand (6th BED column).
+    -n --name                      Use the name of the intervals (4th BED column) in the headers.
+    -j --jobs=<int>                Number of contigs extracted in parallel [Default: 1].
+
+Comments:
+    Headers are written as bedtools getfasta does: >contig:start-end, >name::contig:start-end with
+    --name, followed by (+) or (-) with --strand. Intervals are written grouped by contig, in the
+    order the contigs appear in the BED, so sorted BED files keep their order.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import math
+import sys
+import os
+from .gbk2fasta import reverse_complement
+from .utils import mapped_file, fasta_record_spans, open_output, atomic_output
+
+################################
+### Build and load the index ###
+################################
+def fai_file(fasta):
+    return f"{fasta}.fai"
+
+def fai_entry(mm, contig, seq_start, end):
+    """
+    Computes the (length, offset, bases per line, bytes per line) of a sequence laid out in
+    lines of equal length, which are checked arithmetically.
+    """
+    first_line = mm.find(b'\n', seq_start, end)
+    first_line = end if first_line == -1 else first_line + 1
+    line_width = first_line - seq_start
+    line_bases = len(mm[seq_start:first_line].rstrip(b'\r\n'))
+    data = mm[seq_start:end]
+    length = len(data) - data.count(b'\n') - data.count(b'\r')
+    if line_bases == 0:
+        # only empty sequences have no bases in their first line
+        if length:
+            raise ValueError(f"The sequence {contig} starts with a blank line and cannot be indexed.")
+        return length, seq_start, 0, 0
+    # every line must end where the layout given by the first line expects it
+    lines = math.ceil(length / line_bases)
+    size = length + lines * (line_width - line_bases)
+    breaks = np.frombuffer(data, dtype=np.uint8)[line_width - 1::line_width][:lines - 1]
+    if (size != len(data) and size - (line_width - line_bases) != len(data)) or data.count(b'\n') not in (lines, lines - 1) \
+            or np.any(breaks != ord('\n')):
+        raise ValueError(f"The sequence {contig} has lines of different lengths and cannot be indexed.")
+    return length, seq_start, line_bases, line_width
+
+def build_fai(fasta):
+    index = {}
+    with mapped_file(fasta) as mm:
+        for contig, _, seq_start, end in fasta_record_spans(mm):
+            index[contig] = fai_entry(mm, contig, seq_start, end)
+    # written aside and moved, so concurrent runs never read a partial index
+    with atomic_output(fai_file(fasta), 'w') as f:
+        for contig, entry in index.items():
+            print(contig, *entry, sep='\t', file=f)
+    return index
+
+def load_fai(fasta):
+    """
+    Loads the .fai index of a FASTA as a dict, (re)building it when missing or older than the file.
+    """
+    fai = fai_file(fasta)
+    if not os.path.exists(fai) or os.path.getmtime(fai) < os.path.getmtime(fasta):
+        return build_fai(fasta)
+    with open(fai) as f:
+        return {fields[0]: tuple(int(field) for field in fields[1:5]) for fields in (line.split('\t') for line in f)}
+
+def fastaindex(fasta):
+    try:
+        build_fai(fasta)
+        print(f"Done!\nThe index has been written at: {fai_file(fasta)}")
+    except ValueError as error:
+        print(f"PROBLEM!\n{error}")
+
+#############################
+### Extract BED intervals ###
+#############################
+def load_intervals(bed):
+    """
+    Loads the (start, end, name, strand) intervals of a BED file grouped per contig.
+    """
+    intervals = {}
+    with open(bed) as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) < 3 or line.startswith(('#', 'track', 'browser')):
+                continue
+            name = fields[3] if len(fields) > 3 else '.'
+            strand = fields[5] if len(fields) > 5 else '.'
+            intervals.setdefault(fields[0], []).append((int(fields[1]), int(fields[2]), name, strand))
+    return intervals
+
+def extract_intervals(fasta, contig, entry, intervals, strand=False, name=False):
+    """
+    Worker function returning the FASTA records of the intervals of a contig. Byte offsets are
+    computed from the index, skipping the line breaks arithmetically.
+    """
+    length, offset, line_bases, line_width = entry
+    def position(base):
+        return offset + (base // line_bases) * line_width + base % line_bases if line_bases else offset
+    records = []
+    with mapped_file(fasta) as mm:
+        for start, end, interval_name, interval_strand in intervals:
+            seq = mm[position(start):position(end)].translate(None, b'\r\n')
+            header = f"{contig}:{start}-{end}"
+            if name:
+                header = f"{interval_name}::{header}"
+            if strand:
+                if interval_strand == '-':
+                    seq = reverse_complement(seq)
+                header = f"{header}({'-' if interval_strand == '-' else '+'})"
+            records.append(b'>' + header.encode() + b'\n' + seq + b'\n')
+    return b''.join(records)
+
+def getfasta(fasta, bed, out='stdout', strand=False, name=False, jobs=1):
+    index = load_fai(fasta)
+    intervals = load_intervals(bed)
+
+    # intervals out of the sequences are skipped
+    for contig in list(intervals):
+        valid = [interval for interval in intervals[contig] if contig in index and 0 <= interval[0] <= interval[1] <= index[contig][0]]
+        if len(valid) < len(intervals[contig]):
+            print(f"WARNING: {len(intervals[contig]) - len(valid)} interval(s) of {contig} are out of the FASTA sequences and were skipped.", file=sys.stderr)
+        intervals[contig] = valid
+
+    contigs = [contig for contig in intervals if intervals[contig]]
+    n = len(contigs)
+    with open_output(out) as handle, ProcessPoolExecutor(max_workers=int(jobs)) as pool:
+        for records in pool.map(
+            extract_intervals, [fasta] * n, contigs, [index[contig] for contig in contigs],
+            [intervals[contig] for contig in contigs], [strand] * n, [name] * n
+        ):
+            handle.write(records)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_fetchgbk = """
+A script meant to quickly fetch records from a multisequence genbank file using a byte-offset index (.gbi)
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py fetchgbk [ -h|--help ]
+    falmeida-py fetchgbk [ --gbk <in_gbk> --out <out_gbk> --fofn <file> --reindex ] [ <id>... ]
+
+Options:
+    -h --help                      Show this screen.
+    -g --gbk=<in_gbk>              Gbk file to fetch records from.
+    -o --out=<out_gbk>             Gbk output file [Default: stdout].
+    -f --fofn=<file>               File with the list of records to fetch. One per line, using record ids or LOCUS names.
+    --reindex                      Rebuild the index even if it is up to date.
+
+Comments:
+    The index is saved alongside the genbank file as <in_gbk>.gbi, a tab-separated file with the
+    columns: record id, LOCUS name, byte offset and byte length, after a '#' line with the size of
+    the genbank file. It is built in a single pass the first time it is needed and reused for as
+    long as it is newer than the genbank file and was built for a file of the same size.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import sys
+from .utils import mapped_file, gbk_record_spans, open_output, atomic_output
+
+######################################
+### Build and load the index (gbi) ###
+######################################
+def gbk_index_file(gbk):
+    return f"{gbk}.gbi"
+
+def build_gbk_index(gbk):
+    """
+    Scans a genbank file once and saves its (id, name, offset, length) index to <gbk>.gbi.
+    """
+    index = []
+    with mapped_file(gbk) as mm:
+        size = len(mm)
+        for rec_id, start, end in gbk_record_spans(mm):
+            name = mm[start:mm.find(b'\n', start, end)].split()[1].decode()
+            index.append((rec_id, name, start, end - start))
+    # written aside and moved, so concurrent runs never read a partial index
+    try:
+        with atomic_output(gbk_index_file(gbk), 'w') as f:
+            print(f"#{size}", file=f)
+            for entry in index:
+                print(*entry, sep='\t', file=f)
+    except OSError:
+        # read-only locations just keep the index in memory
+        pass
+    return index
+
+def load_gbk_index(gbk, reindex=False):
+    """
+    Loads the index of a genbank file, (re)building it when missing, older than the file or built
+    for a file of another size, as a dict mapping both record ids and LOCUS names to (offset, length).
+    """
+    gbi = gbk_index_file(gbk)
+    index = None
+    if not reindex and os.path.exists(gbi) and os.path.getmtime(gbi) >= os.path.getmtime(gbk):
+        with open(gbi) as f:
+            # files copied keeping their times (cp -p, rsync -a) are told apart by their size
+            if f.readline().rstrip('\n') == f"#{os.path.getsize(gbk)}":
+                index = [line.rstrip('\n').split('\t') for line in f]
+    if index is None:
+        index = build_gbk_index(gbk)
+    lookup = {}
+    for rec_id, name, offset, length in index:
+        lookup.setdefault(name, (int(offset), int(length)))
+        lookup[rec_id] = (int(offset), int(length))
+    return lookup
+
+def read_gbk_record(handle, entry):
+    """
+    Reads the raw bytes of one indexed record from an open (binary) genbank file handle.
+    """
+    offset, length = entry
+    handle.seek(offset)
+    return handle.read(length)
+
+######################
+### Fetch function ###
+######################
+def fetchgbk(gbk, ids, out, genes_list=None, reindex=False):
+    index = load_gbk_index(gbk, reindex)
+    if genes_list:
+        with open(genes_list) as f:
+            ids = list(ids) + [line.strip() for line in f if line.strip()]
+
+    missing = [rec_id for rec_id in ids if rec_id not in index]
+    if missing:
+        print(f"WARNING: records not found in {gbk}: {', '.join(missing)}", file=sys.stderr)
+
+    with open(gbk, 'rb') as handle, open_output(out) as out_handle:
+        for rec_id in ids:
+            if rec_id in index:
+                out_handle.write(read_gbk_record(handle, index[rec_id]))
@@ -12,59 +12,284 @@ Usage:
     falmeida-py gbk2fasta
     falmeida-py gbk2fasta -h|--help
     falmeida-py gbk2fasta -v|--version
-    falmeida-py gbk2fasta ( --gbk <genbank> ) [ --out <fasta> --fofn <file> --type <type> ]
+    falmeida-py gbk2fasta ( --gbk <genbank> | --index <db> ) [ --out <fasta> --outdir <dir> --fofn <file> --type <type> --dedup <tsv> --jobs <int> --biopython --cache-dir <dir> --cache-size <size> ]
 
 Options:
     -h --help                   Show this screen.
     -v --version                Show version information
-    -g --gbk <genbank>          Genbank file to be converted to fasta
+    -g --gbk <genbank>          Genbank file to be converted to fasta. For multiple genomes, also accepts a directory,
+                                a (quoted) glob pattern or a file listing one genbank path per line.
+    -i --index <db>             Retrieve the --fofn genes from an index built with indexgbk, instead of scanning genbank files.
     -o --out <fasta>            Output fasta file [Default: stdout]
+    -d --outdir <dir>           With multiple genomes, write one fasta per genbank (<name>.faa or <name>.ffn) in this
+                                directory (must already exist), instead of a single merged --out fasta.
     -f --fofn <file>            File with the list of genes to be extracted. One gene per line, using the 'locus_tag' field.
     -t --type <type>            Type of sequence to output genes: nucl or prot [Default: prot]
+    --dedup <tsv>               Write identical sequences only once, and save to this file a tab-separated
+                                map of every gene to the gene representing its sequence. Needs a single output fasta.
+    -j --jobs <int>             Number of genbank files converted in parallel [Default: 1]
+    --biopython                 Parse the genbank with Biopython instead of the built-in lightweight parser.
+    --cache-dir <dir>           Directory to cache parsed genbank files, so later runs on the same files skip parsing.
+    --cache-size <size>         Maximum size of the cache, least recently used files are evicted first [Default: 5G]
+
+Comments:
+    When multiple genomes are merged into one fasta, headers are prefixed with the genbank name
+    (<name>|<locus_tag>) and genomes are written in the order they were given.
 """
 
 ##################################
 ### Loading Necessary Packages ###
 ##################################
 from Bio import SeqIO
+from Bio.Data import CodonTable, IUPACData
+from Bio.SeqFeature import BeforePosition, AfterPosition
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import product
+from pathlib import Path
+import numpy as np
+import tempfile
+import hashlib
+import shutil
+import os
+from .gbkparser import parse_gbk
+from .utils import find_gbk_files, open_output
 
-#########################################
-### load list of genes as python list ###
-#########################################
+########################################
+### load list of genes as python set ###
+########################################
 def load_gene_list(genes_list):
     """
     Loads a list of genes from a file.
     """
-    genes = []
     with open(genes_list, 'r') as f:
-        for line in f:
-            genes.append(line.strip())
-    return genes
-
-#################################################
-### prints a fasta from gbk biopython feature ###
-#################################################
-def print_fasta(feature, genes_list):
-    if genes_list == None:
-        print(f">{feature.qualifiers['locus_tag'][0]} {feature.qualifiers['product'][0]}")
-        print(feature.qualifiers['translation'][0])
-    else:
-        if feature.qualifiers['locus_tag'][0] in genes_list:
-            print(f">{feature.qualifiers['locus_tag'][0]} {feature.qualifiers['product'][0]}")
-            print(feature.qualifiers['translation'][0])
+        return set(line.strip() for line in f)
+
+#############################
+### Sequence manipulation ###
+#############################
+complement_table = bytes.maketrans(b'ACGTRYKMBVDHNacgtrykmbvdhn', b'TGCAYRMKVBHDNtgcayrmkvbhdn')
+
+# nucleotides as 4-bit sets of bases (T, C, A, G), so IUPAC codes are the union of their bases
+iupac_bases = {
+    'T': 1, 'U': 1, 'C': 2, 'A': 4, 'G': 8, 'Y': 3, 'W': 5, 'M': 6, 'K': 9, 'S': 10,
+    'B': 11, 'R': 12, 'D': 13, 'H': 7, 'V': 14, 'N': 15
+}
+nucl_bits = bytearray(256)
+for base, bits in iupac_bases.items():
+    nucl_bits[ord(base)] = nucl_bits[ord(base.lower())] = bits
+nucl_bits = bytes(nucl_bits)
+bits_base = {bits: base for base, bits in iupac_bases.items() if base != 'U'}
+
+# amino acids read from ambiguous codons, from the most specific code (e.g. B is D or N)
+ambiguous_amino_acids = sorted(IUPACData.extended_protein_values.items(), key=lambda item: len(item[1]))
+
+def resolve_amino_acid(options):
+    if '*' in options:
+        return '*' if options == {'*'} else 'X'
+    return next((code for code, values in ambiguous_amino_acids if options <= set(values)), 'X')
+
+@lru_cache(maxsize=None)
+def codon_lookup(table_id):
+    """
+    Builds, for a NCBI translation table, arrays indexed by codon number (three 4-bit base sets)
+    giving the amino acid and whether the codon is a start codon. Ambiguous codons are resolved
+    as Biopython does, from the amino acids of all their expansions (e.g. GAR is E and RAT is B).
+    """
+    table = CodonTable.unambiguous_dna_by_id[int(table_id)]
+    amino_acids = np.full(4096, ord('X'), dtype=np.uint8)
+    starts = np.zeros(4096, dtype=bool)
+    expansions = {bits: [base for base in 'TCAG' if bits & iupac_bases[base]] for bits in bits_base}
+    for a, b, c in product(bits_base, repeat=3):
+        options = set(
+            table.forward_table.get(x + y + z, '*')
+            for x in expansions[a] for y in expansions[b] for z in expansions[c]
+        )
+        amino_acids[256 * a + 16 * b + c] = ord(resolve_amino_acid(options))
+    for codon in table.start_codons:
+        starts[256 * iupac_bases[codon[0]] + 16 * iupac_bases[codon[1]] + iupac_bases[codon[2]]] = True
+    return amino_acids, starts
+
+def reverse_complement(seq):
+    return seq.translate(complement_table)[::-1]
+
+def translate(seq, table_id=11, complete=True):
+    """
+    Translates a CDS (bytes) with a vectorized codon table lookup. The first codon of a complete
+    CDS is read as Methionine when it is an alternative start codon, and a final stop codon is dropped.
+    """
+    amino_acids, starts = codon_lookup(table_id)
+    bits = np.frombuffer(seq.translate(nucl_bits), dtype=np.uint8)[:len(seq) // 3 * 3].reshape(-1, 3).astype(np.intp)
+    codons = 256 * bits[:, 0] + 16 * bits[:, 1] + bits[:, 2]
+    protein = amino_acids[codons]
+    if complete and len(codons) and starts[codons[0]]:
+        protein[0] = ord('M')
+    protein = protein.tobytes()
+    return protein[:-1] if protein.endswith(b'*') else protein
+
+def extract_nucl(seq, parts):
+    """
+    Extracts and joins the (start, end, strand) parts of a feature from its record sequence.
+    """
+    return b''.join(
+        reverse_complement(seq[start:end]) if strand == -1 else seq[start:end]
+        for start, end, strand in parts
+    )
+
+####################################################
+### parsed records from lightweight or biopython ###
+####################################################
+def record_seq(record):
+    if isinstance(record.seq, bytes):
+        return record.seq
+    return bytes(record.seq).upper()
+
+def feature_parts(feature):
+    if hasattr(feature, 'parts'):
+        return feature.parts
+    return [(int(part.start), int(part.end), part.strand) for part in feature.location.parts]
+
+def five_prime_partial(feature):
+    """
+    Whether a feature misses its 5' end: '<' on the start of a plus strand feature, or '>' on the
+    end of a minus strand one (e.g. complement(1..>100)).
+    """
+    if hasattr(feature, 'parts'):
+        parts = feature.parts
+        return bool(parts) and ('>' if parts[0][2] == -1 else '<') in feature.location
+    part = feature.location.parts[0]
+    return isinstance(part.end, AfterPosition) if part.strand == -1 else isinstance(part.start, BeforePosition)
+
+#####################################################
+### extracts the CDS sequences of genbank records ###
+#####################################################
+def cds_sequences(records, genes, seq_type):
+    """
+    Yields the (header, sequence) of every CDS (in genes, when given) as bytes. Proteins
+    missing a translation qualifier are translated from the record sequence.
+    """
+    for record in records:
+        seq = None
+        for feature in record.features:
+            if feature.type != "CDS":
+                continue
+            qualifiers = feature.qualifiers
+            locus_tag = qualifiers.get('locus_tag', qualifiers.get('protein_id', [None]))[0]
+            if genes is not None and locus_tag not in genes:
+                continue
+            if locus_tag is None:
+                locus_tag = f"{record.id}_{feature_parts(feature)[0][0] + 1}"
+            header = f"{locus_tag} {qualifiers['product'][0]}" if 'product' in qualifiers else locus_tag
+
+            if seq_type == 'prot' and 'translation' in qualifiers:
+                yield header, qualifiers['translation'][0].encode()
+                continue
+            if seq is None:
+                seq = record_seq(record)
+            nucl = extract_nucl(seq, feature_parts(feature))
+            if seq_type == 'nucl':
+                yield header, nucl
+            else:
+                # partial CDSs do not start with a real start codon
+                codon_start = int(qualifiers.get('codon_start', ['1'])[0])
+                complete = codon_start == 1 and not five_prime_partial(feature)
+                yield header, translate(nucl[codon_start - 1:], qualifiers.get('transl_table', ['11'])[0], complete)
+
+######################################
+### writes and deduplicates fastas ###
+######################################
+def write_sequences(handle, sequences, prefix=b'>'):
+    for header, seq in sequences:
+        handle.write(prefix + header.encode() + b'\n' + seq + b'\n')
+
+def read_sequences(fasta):
+    """
+    Reads back the (header, sequence) pairs of a fasta written by write_sequences.
+    """
+    with open(fasta, 'rb') as f:
+        for header in f:
+            yield header[1:-1].decode(), next(f)[:-1]
+
+def dedup_sequences(sequences, mapping, seen):
+    """
+    Keeps only the first of identical sequences, streaming. Only a 128-bit digest of each unique
+    sequence is kept in `seen`, and every gene is mapped to its representative in `mapping`.
+    """
+    for header, seq in sequences:
+        name, key = header.split(' ', 1)[0], hashlib.blake2b(seq, digest_size=16).digest()
+        if key in seen:
+            mapping.write(f"{name}\t{seen[key]}\n".encode())
+        else:
+            seen[key] = name
+            mapping.write(f"{name}\t{name}\n".encode())
+            yield header, seq
 
 ###########################################
 ### loads and converts genbank to fasta ###
 ###########################################
-def convertgbk(genbank, genes_list):
+def genbank_cds_sequences(genbank, genes, seq_type, biopython=False, cache_dir=None, cache_size='5G'):
+    records = SeqIO.parse(genbank, "genbank") if biopython else parse_gbk(genbank, True, cache_dir, cache_size)
+    return cds_sequences(records, genes, seq_type)
+
+def convert_genome(genbank, out, seq_type, prefix, biopython, cache_dir, cache_size):
+    # worker function, the gene list is set by init_worker
+    sequences = genbank_cds_sequences(genbank, worker_genes, seq_type, biopython, cache_dir, cache_size)
+    with open_output(out) as handle:
+        write_sequences(handle, sequences, f">{prefix}|".encode() if prefix else b'>')
+    return out
+
+def convertgbk(genbank, genes_list, out='stdout', seq_type='prot', dedup=None, biopython=False, cache_dir=None, cache_size='5G'):
     """
-    Loads a genbank file and converts it to fasta.
+    Loads a genbank file and converts its CDSs to a (nucl or prot) fasta.
     """
     if genes_list:
         genes = load_gene_list(genes_list)
     else:
         genes = None
-    for record in SeqIO.parse(genbank, "genbank"):
-        for feature in record.features:
-            if feature.type == "CDS":
-                print_fasta(feature, genes)
\ No newline at end of file
+    sequences = genbank_cds_sequences(genbank, genes, seq_type, biopython, cache_dir, cache_size)
+    with open_output(out) as handle:
+        if dedup:
+            with open(dedup, 'wb', buffering=1 << 20) as mapping:
+                write_sequences(handle, dedup_sequences(sequences, mapping, {}))
+        else:
+            write_sequences(handle, sequences)
+
+###############################################
+### converts multiple genbank files in pool ###
+###############################################
+worker_genes = None
+
+def init_worker(genes):
+    # the gene list is sent once to each worker, not with every file
+    global worker_genes
+    worker_genes = genes
+
+def convertgbks(genbanks, genes_list, out='stdout', outdir=None, seq_type='prot', dedup=None, jobs=1, biopython=False, cache_dir=None, cache_size='5G'):
+    """
+    Converts many genbank files in parallel, either to one fasta each in outdir, or to
+    a single fasta (in input order) with the genome names prefixed to the headers.
+    """
+    genbanks = find_gbk_files(genbanks)
+    genes = load_gene_list(genes_list) if genes_list else None
+    names = [Path(genbank).stem for genbank in genbanks]
+    n = len(genbanks)
+
+    with tempfile.TemporaryDirectory(prefix='falmeida-py-') as workdir, \
+        ProcessPoolExecutor(max_workers=int(jobs), initializer=init_worker, initargs=(genes,)) as pool:
+        if outdir:
+            suffix = 'faa' if seq_type == 'prot' else 'ffn'
+            outs = [os.path.join(outdir, f"{name}.{suffix}") for name in names]
+            list(pool.map(convert_genome, genbanks, outs, [seq_type] * n, [None] * n, [biopython] * n, [cache_dir] * n, [cache_size] * n))
+        else:
+            outs = [os.path.join(workdir, f"{i}.fasta") for i in range(n)]
+            parts = pool.map(convert_genome, genbanks, outs, [seq_type] * n, names, [biopython] * n, [cache_dir] * n, [cache_size] * n)
+            with open_output(out) as handle, open(dedup or os.devnull, 'wb', buffering=1 << 20) as mapping:
+                seen = {}
+                # results come back in input order, each one appended as soon as it is ready
+                for part in parts:
+                    if dedup:
+                        write_sequences(handle, dedup_sequences(read_sequences(part), mapping, seen))
+                    else:
+                        with open(part, 'rb') as f:
+                            shutil.copyfileobj(f, handle, 1 << 20)
+                    os.remove(part)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_gbk2table = """
+A script meant to export the features of many genbank files as a columnar (Parquet or Arrow) dataset.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py gbk2table [ -h|--help ]
+    falmeida-py gbk2table [ --gbk <genbank> --outdir <dataset> --format <format> --all-qualifiers --jobs <int> --biopython ]
+
+Options:
+    -h --help                      Show this screen.
+    -g --gbk=<genbank>             Genbank file, directory, (quoted) glob pattern or file listing one genbank path per line.
+    -o --outdir=<dataset>          Directory of the dataset, created or appended to [Default: features_dataset].
+    -f --format=<format>           Format of the dataset files: parquet or arrow [Default: parquet].
+    -a --all-qualifiers            Also save all the qualifiers of the features in a 'qualifiers' map column.
+    -j --jobs=<int>                Number of genbank files converted in parallel [Default: 1].
+    --biopython                    Parse the genbank with Biopython instead of the built-in lightweight parser.
+
+Comments:
+    Each feature is a row with the columns: record_id, type, start (1-based), end, strand, locus_tag,
+    product and gene. String columns are dictionary-encoded. The dataset is partitioned by genbank
+    name (<outdir>/genome=<name>/part-0.<format>), so new files are appended as new partitions and
+    files converted again replace their own partition. Requires pyarrow (the 'table' extra).
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from Bio import SeqIO
+import importlib.util
+import os
+from .gbkparser import parse_gbk
+from .gbk2fasta import feature_parts
+from .utils import find_gbk_files
+
+#########################################
+### Collect the features of a genbank ###
+#########################################
+def feature_columns(genbank, all_qualifiers=False, biopython=False):
+    columns = {key: [] for key in ["record_id", "type", "start", "end", "strand", "locus_tag", "product", "gene"]}
+    if all_qualifiers:
+        columns["qualifiers"] = []
+    records = SeqIO.parse(genbank, "genbank") if biopython else parse_gbk(genbank)
+    for record in records:
+        for feature in record.features:
+            parts = feature_parts(feature)
+            strands = set(strand for _, _, strand in parts)
+            qualifiers = feature.qualifiers
+            columns["record_id"].append(record.id)
+            columns["type"].append(feature.type)
+            columns["start"].append(min(start for start, _, _ in parts) + 1 if parts else None)
+            columns["end"].append(max(end for _, end, _ in parts) if parts else None)
+            columns["strand"].append(strands.pop() if len(strands) == 1 else None)
+            for key in ["locus_tag", "product", "gene"]:
+                columns[key].append(qualifiers[key][0] if key in qualifiers else None)
+            if all_qualifiers:
+                columns["qualifiers"].append([(key, "; ".join(values)) for key, values in qualifiers.items()])
+    return columns
+
+#################################
+### Write a dataset partition ###
+#################################
+def write_partition(genbank, outdir, file_format='parquet', all_qualifiers=False, biopython=False):
+    import pyarrow as pa
+
+    columns = feature_columns(genbank, all_qualifiers, biopython)
+    arrays = {
+        "record_id": pa.array(columns["record_id"], pa.string()).dictionary_encode(),
+        "type": pa.array(columns["type"], pa.string()).dictionary_encode(),
+        "start": pa.array(columns["start"], pa.int64()),
+        "end": pa.array(columns["end"], pa.int64()),
+        "strand": pa.array(columns["strand"], pa.int8()),
+        "locus_tag": pa.array(columns["locus_tag"], pa.string()),
+        "product": pa.array(columns["product"], pa.string()).dictionary_encode(),
+        "gene": pa.array(columns["gene"], pa.string()).dictionary_encode(),
+    }
+    if all_qualifiers:
+        arrays["qualifiers"] = pa.array(columns["qualifiers"], pa.map_(pa.string(), pa.string()))
+    table = pa.table(arrays)
+
+    partition = os.path.join(outdir, f"genome={Path(genbank).stem}")
+    os.makedirs(partition, exist_ok=True)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, os.path.join(partition, "part-0.parquet"))
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, os.path.join(partition, "part-0.arrow"))
+    return table.num_rows
+
+#####################
+### main function ###
+#####################
+def gbk2table(genbanks, outdir, file_format='parquet', all_qualifiers=False, jobs=1, biopython=False):
+    # pyarrow is an optional dependency, only needed by this command
+    if importlib.util.find_spec('pyarrow') is None:
+        print("PROBLEM!\nThe gbk2table command requires pyarrow, please install it with: pip install pyarrow (or conda install pyarrow).")
+        return
+
+    genbanks = find_gbk_files(genbanks)
+    names = [Path(genbank).stem for genbank in genbanks]
+    duplicated = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicated:
+        raise ValueError(f"Different genbank files would write the same partition (genome=<name>), rename them: {', '.join(duplicated)}")
+    n = len(genbanks)
+    os.makedirs(outdir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=int(jobs)) as pool:
+        rows = sum(pool.map(
+            write_partition, genbanks, [outdir] * n, [file_format] * n, [all_qualifiers] * n, [biopython] * n
+        ))
+    print(f"Done!\n{rows} features of {n} genbank file(s) have been written at: {outdir}")
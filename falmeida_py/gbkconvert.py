@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_gbkconvert = """
+A script meant to convert a genbank file into several formats (proteins, genes, genome, GFF3 and BED) at once.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py gbkconvert [ -h|--help ]
+    falmeida-py gbkconvert [ --gbk <genbank> --faa <fasta> --ffn <fasta> --fna <fasta> --gff3 <gff> --bed <bed> --biopython ]
+
+Options:
+    -h --help                      Show this screen.
+    -g --gbk=<genbank>             Genbank file to convert.
+    --faa=<fasta>                  Write the CDS proteins to this fasta.
+    --ffn=<fasta>                  Write the CDS nucleotide sequences to this fasta.
+    --fna=<fasta>                  Write the record (contig) sequences to this fasta.
+    --gff3=<gff>                   Write the features (except sources) to this GFF3 file.
+    --bed=<bed>                    Write the features (except sources) to this BED6 file.
+    --biopython                    Parse the genbank with Biopython instead of the built-in lightweight parser.
+
+Comments:
+    The genbank is parsed only once, one record at a time, and every requested output is written
+    along the way. Any output can be 'stdout'.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from contextlib import ExitStack
+from urllib.parse import quote
+from Bio import SeqIO
+from .gbkparser import parse_gbk
+from .gbk2fasta import cds_sequences, write_sequences, record_seq, feature_parts
+from .utils import open_output
+
+#######################
+### Feature writers ###
+#######################
+def feature_name(feature, n):
+    qualifiers = feature.qualifiers
+    for key in ['locus_tag', 'gene', 'protein_id']:
+        if key in qualifiers:
+            return qualifiers[key][0]
+    return f"{feature.type}_{n}"
+
+def gff_attributes(attributes):
+    # reserved GFF3 characters are percent-encoded and flags (/pseudo) become true
+    return ';'.join(
+        f"{quote(key, safe=' ')}={','.join(quote(value, safe=' :|()[]/+-.') if value else 'true' for value in values)}"
+        for key, values in attributes.items()
+    )
+
+def gff3_lines(record):
+    """
+    Yields the GFF3 lines of the (non-source) features of a record. Genes are identified by their
+    locus_tag and other features with the same locus_tag become their children. Each part of a
+    joined location is written as a line sharing the feature ID.
+    """
+    genes = set(feature.qualifiers['locus_tag'][0] for feature in record.features if feature.type == 'gene' and 'locus_tag' in feature.qualifiers)
+    yield f"##sequence-region {record.id} 1 {getattr(record, 'length', None) or len(record.seq)}\n"
+    for n, feature in enumerate(record.features, 1):
+        if feature.type == 'source':
+            continue
+        qualifiers = feature.qualifiers
+        name = feature_name(feature, n)
+        attributes = {'ID': [name if feature.type == 'gene' else f"{name}_{feature.type}"]}
+        if feature.type != 'gene' and name in genes:
+            attributes['Parent'] = [name]
+        attributes.update((key, values) for key, values in qualifiers.items() if key != 'translation')
+
+        # the phase of each CDS part follows from the bases left over by the previous parts
+        phase, done = int(qualifiers.get('codon_start', ['1'])[0]) - 1, 0
+        for start, end, strand in feature_parts(feature):
+            frame = (3 - (done - phase) % 3) % 3 if done else phase
+            # sites between two bases (12^13) are zero-length features at the left base
+            yield '\t'.join([
+                record.id, 'falmeida-py', feature.type, str(start + 1 if end > start else start), str(end), '.',
+                {1: '+', -1: '-'}.get(strand, '.'), str(frame) if feature.type == 'CDS' else '.',
+                gff_attributes(attributes)
+            ]) + '\n'
+            done += end - start
+
+def bed_lines(record):
+    """
+    Yields the BED6 lines of the (non-source) features of a record, spanning all of their parts.
+    """
+    for n, feature in enumerate(record.features, 1):
+        if feature.type == 'source':
+            continue
+        parts = feature_parts(feature)
+        if not parts:
+            continue
+        strands = set(strand for _, _, strand in parts)
+        yield '\t'.join([
+            record.id, str(min(start for start, _, _ in parts)), str(max(end for _, end, _ in parts)),
+            feature_name(feature, n), '0', {1: '+', -1: '-'}.get(strands.pop() if len(strands) == 1 else None, '.')
+        ]) + '\n'
+
+#####################
+### main function ###
+#####################
+def gbkconvert(genbank, faa=None, ffn=None, fna=None, gff3=None, bed=None, biopython=False):
+    # sequences are only loaded when an output may need them
+    with_seq = bool(faa or ffn or fna)
+    records = SeqIO.parse(genbank, "genbank") if biopython else parse_gbk(genbank, with_seq)
+
+    with ExitStack() as stack:
+        handles = {
+            name: stack.enter_context(open_output(out))
+            for name, out in [('faa', faa), ('ffn', ffn), ('fna', fna), ('gff3', gff3), ('bed', bed)] if out
+        }
+        if 'gff3' in handles:
+            handles['gff3'].write(b'##gff-version 3\n')
+
+        # one record at a time goes through every output
+        for record in records:
+            if 'faa' in handles:
+                write_sequences(handles['faa'], cds_sequences([record], None, 'prot'))
+            if 'ffn' in handles:
+                write_sequences(handles['ffn'], cds_sequences([record], None, 'nucl'))
+            if 'fna' in handles:
+                write_sequences(handles['fna'], [(record.id, record_seq(record))])
+            if 'gff3' in handles:
+                handles['gff3'].write(''.join(gff3_lines(record)).encode())
+            if 'bed' in handles:
+                handles['bed'].write(''.join(bed_lines(record)).encode())
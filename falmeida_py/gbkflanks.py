@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_gbkflanks = """
+A script meant to extract the upstream and/or downstream (strand-aware) flanking regions of the CDSs of genbank files.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py gbkflanks [ -h|--help ]
+    falmeida-py gbkflanks [ --gbk <genbank> --out <fasta> --fofn <file> --upstream <int> --downstream <int> --biopython ]
+
+Options:
+    -h --help                      Show this screen.
+    -g --gbk=<genbank>             Genbank file, directory, (quoted) glob pattern or file listing one genbank path per line.
+    -o --out=<fasta>               Output fasta file [Default: stdout].
+    -f --fofn=<file>               File with the list of genes to extract flanks from. One gene per line, using the 'locus_tag' field.
+    -u --upstream=<int>            Length (bp) of the upstream regions to extract [Default: 0].
+    -d --downstream=<int>          Length (bp) of the downstream regions to extract [Default: 0].
+    --biopython                    Parse the genbank with Biopython instead of the built-in lightweight parser.
+
+Comments:
+    Flanks are oriented as the CDS: upstream regions of minus strand CDSs lie after their end and are
+    reverse complemented. Flanks are clipped at the contig ends. Headers are:
+        ><locus_tag>_upstream <contig>:<start>-<end>(<strand>)
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from Bio import SeqIO
+from .gbkparser import parse_gbk
+from .gbk2fasta import load_gene_list, reverse_complement, record_seq, feature_parts
+from .utils import find_gbk_files, open_output
+
+##########################
+### Flanks of a record ###
+##########################
+def cds_flanks(record, genes, upstream, downstream):
+    """
+    Yields the (header, sequence) of the flanks of every CDS (in genes, when given) of a record.
+    The contig and its reverse complement are held as two buffers and flanks are memoryview
+    slices of them, so no sequence is copied per flank.
+    """
+    seq = forward = reverse = None
+    for feature in record.features:
+        if feature.type != "CDS":
+            continue
+        qualifiers = feature.qualifiers
+        locus_tag = qualifiers.get('locus_tag', qualifiers.get('protein_id', [None]))[0]
+        parts = feature_parts(feature)
+        if (genes is not None and locus_tag not in genes) or not parts:
+            continue
+        start, end = min(start for start, _, _ in parts), max(end for _, end, _ in parts)
+        strand = -1 if all(strand == -1 for _, _, strand in parts) else 1
+        if locus_tag is None:
+            locus_tag = f"{record.id}_{start + 1}"
+
+        if seq is None:
+            seq = record_seq(record)
+            forward, reverse = memoryview(seq), memoryview(reverse_complement(seq))
+        # (name, length, whether the flank lies before the CDS on the forward strand)
+        for name, length, before in [('upstream', upstream, strand == 1), ('downstream', downstream, strand == -1)]:
+            if not length:
+                continue
+            flank_start, flank_end = (max(0, start - length), start) if before else (end, min(len(seq), end + length))
+            if flank_start >= flank_end:
+                continue
+            header = f"{locus_tag}_{name} {record.id}:{flank_start + 1}-{flank_end}({'+' if strand == 1 else '-'})"
+            if strand == 1:
+                yield header, forward[flank_start:flank_end]
+            else:
+                yield header, reverse[len(seq) - flank_end:len(seq) - flank_start]
+
+#####################
+### main function ###
+#####################
+def gbkflanks(genbanks, out='stdout', genes_list=None, upstream=0, downstream=0, biopython=False):
+    genes = load_gene_list(genes_list) if genes_list else None
+    with open_output(out) as handle:
+        for genbank in find_gbk_files(genbanks):
+            records = SeqIO.parse(genbank, "genbank") if biopython else parse_gbk(genbank, with_seq=True)
+            for record in records:
+                for header, seq in cds_flanks(record, genes, int(upstream), int(downstream)):
+                    handle.write(b'>' + header.encode() + b'\n')
+                    handle.write(seq)
+                    handle.write(b'\n')
@@ -0,0 +1,341 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import re
+import os
+import json
+import struct
+import hashlib
+from .utils import mapped_file, gbk_record_spans, parse_size, atomic_output
+
+# bumped whenever the parsed representation changes
+parser_version = 2
+
+# bytes dropped from ORIGIN lines to get the bare sequence
+seq_delete = b' \t\r\n0123456789/'
+
+#####################################
+### Parse INSDC feature locations ###
+#####################################
+def split_top_level(text):
+    parts, depth, last = [], 0, 0
+    for i, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[last:i])
+            last = i + 1
+    parts.append(text[last:])
+    return parts
+
+def parse_location(location, strand=1):
+    """
+    Converts an INSDC location string into a list of (start, end, strand) parts, with 0-based
+    half-open coordinates, in biological order (as the parts of a Biopython CompoundLocation).
+    Parts on remote entries (ACC:1..10) are skipped.
+    """
+    location = location.strip()
+    if location.startswith('complement(') and location.endswith(')'):
+        return [(start, end, -part_strand) for start, end, part_strand in reversed(parse_location(location[11:-1], strand))]
+    if location.startswith(('join(', 'order(')) and location.endswith(')'):
+        inner = location[location.index('(') + 1:-1]
+        return [part for sub in split_top_level(inner) for part in parse_location(sub, strand)]
+    if ':' in location:
+        return []
+    if '..' in location:
+        start, end = location.split('..', 1)
+        return [(int(re.findall(r'\d+', start)[0]) - 1, int(re.findall(r'\d+', end)[-1]), strand)]
+    if '^' in location:
+        start = int(re.findall(r'\d+', location)[0])
+        return [(start, start, strand)]
+    start = int(re.findall(r'\d+', location)[0]) - 1
+    return [(start, start + 1, strand)]
+
+##########################################
+### Decode raw qualifiers of a feature ###
+##########################################
+def decode_qualifiers(lines):
+    """
+    Decodes the qualifier lines of a feature block into a dict of lists, like Biopython does.
+    """
+    qualifiers, key, values, in_quotes = {}, None, [], False
+    for line in lines:
+        text = line[21:].rstrip().decode('utf-8', 'replace')
+        if text.startswith('/') and not in_quotes:
+            if key is not None:
+                qualifiers.setdefault(key, []).append(join_qualifier(key, values))
+            key, _, value = text[1:].partition('=')
+            values = [value] if value else []
+            in_quotes = value.count('"') % 2 == 1
+        elif key is not None and text:
+            values.append(text)
+            in_quotes ^= text.count('"') % 2 == 1
+    if key is not None:
+        qualifiers.setdefault(key, []).append(join_qualifier(key, values))
+    return qualifiers
+
+def join_qualifier(key, values):
+    value = ('' if key == 'translation' else ' ').join(values)
+    if len(value) > 1 and value[0] == '"' and value[-1] == '"':
+        value = value[1:-1].replace('""', '"')
+    return value
+
+######################
+### Parsed objects ###
+######################
+class GbkFeature:
+    """
+    A feature of a genbank record holding its raw bytes. The location and the
+    qualifiers are only decoded when first accessed. Features loaded from the
+    parse cache have them already decoded and no raw bytes (block is None).
+    """
+    __slots__ = ('type', 'location', 'offset', 'block', '_parts', '_qualifiers')
+
+    def __init__(self, type, location, offset, block):
+        self.type = type
+        self.location = location
+        self.offset = offset
+        self.block = block
+        self._parts = None
+        self._qualifiers = None
+
+    @property
+    def parts(self):
+        if self._parts is None:
+            self._parts = parse_location(self.location)
+        return self._parts
+
+    @property
+    def start(self):
+        return min(start for start, end, strand in self.parts)
+
+    @property
+    def end(self):
+        return max(end for start, end, strand in self.parts)
+
+    @property
+    def strand(self):
+        strands = set(strand for start, end, strand in self.parts)
+        return strands.pop() if len(strands) == 1 else None
+
+    @property
+    def qualifiers(self):
+        if self._qualifiers is None:
+            lines = self.block.split(b'\n')
+            first = next((i for i, line in enumerate(lines[1:], 1) if line[21:22] == b'/'), len(lines))
+            self._qualifiers = decode_qualifiers(lines[first:])
+        return self._qualifiers
+
+    def get(self, key, default=None):
+        """
+        Returns the first value of a qualifier.
+        """
+        values = self.qualifiers.get(key)
+        return values[0] if values else default
+
+class GbkRecord:
+    """
+    A genbank record, with the byte offsets of its sections in the file it was parsed from.
+    The sequence is only loaded (as upper case bytes) when requested.
+    """
+    __slots__ = ('id', 'name', 'length', 'offset', 'features_offset', 'tail_offset', 'end_offset', 'features', 'seq')
+
+    def __init__(self, id, name, length, offset, features_offset, tail_offset, end_offset, features, seq=None):
+        self.id = id
+        self.name = name
+        self.length = length
+        self.offset = offset
+        self.features_offset = features_offset
+        self.tail_offset = tail_offset
+        self.end_offset = end_offset
+        self.features = features
+        self.seq = seq
+
+###################
+### Main parser ###
+###################
+def locus_length(locus):
+    """
+    Returns the length given by the (split) LOCUS line of a record, the number before bp or aa.
+    """
+    return next((int(locus[i - 1]) for i in range(2, len(locus)) if locus[i] in (b'bp', b'aa') and locus[i - 1].isdigit()), None)
+
+def parse_gbk_record(buffer, rec_id, start, end, with_seq=False):
+    """
+    Parses the record found at buffer[start:end] (a span from gbk_record_spans).
+    """
+    locus = buffer[start:buffer.find(b'\n', start, end)].split()
+    name = locus[1].decode() if len(locus) > 1 else ''
+    length = locus_length(locus)
+
+    # the sequence lies after ORIGIN, so it is never scanned line by line
+    origin = buffer.rfind(b'\nORIGIN', start, end)
+    origin = end if origin == -1 else origin + 1
+    features_offset = buffer.find(b'\nFEATURES', start, origin)
+    features_offset = origin if features_offset == -1 else features_offset + 1
+
+    # features are blocks of lines starting with a key at column 5
+    features, tail_offset = [], origin
+    lines = buffer[features_offset:origin].split(b'\n')
+    offset = features_offset + len(lines[0]) + 1
+    block_start, block_lines = None, []
+    for line in lines[1:]:
+        if line[:5] == b'     ' and line[5:6] not in (b' ', b''):
+            if block_lines:
+                features.append(new_feature(buffer, block_start, offset, block_lines))
+            block_start, block_lines = offset, [line]
+        elif line[:1] == b' ' and block_lines:
+            block_lines.append(line)
+        elif line.strip():
+            tail_offset = offset
+            break
+        offset += len(line) + 1
+    else:
+        tail_offset = min(offset, origin)
+    if block_lines:
+        features.append(new_feature(buffer, block_start, tail_offset, block_lines))
+
+    seq = None
+    if with_seq and origin < end:
+        seq = buffer[buffer.find(b'\n', origin, end) + 1:end].translate(None, seq_delete).upper()
+
+    return GbkRecord(rec_id, name, length, start, features_offset, tail_offset, end, features, seq)
+
+def new_feature(buffer, block_start, block_end, block_lines):
+    # location may continue over lines until the first qualifier
+    location = [block_lines[0][21:].strip()]
+    for line in block_lines[1:]:
+        if line[21:22] == b'/':
+            break
+        location.append(line.strip())
+    return GbkFeature(
+        block_lines[0][5:21].strip().decode(),
+        b''.join(location).decode(),
+        block_start,
+        buffer[block_start:block_end]
+    )
+
+def parse_gbk_bytes(buffer, with_seq=False):
+    """
+    Lazily parses every record of genbank data held in memory (bytes or mmap).
+    """
+    for rec_id, start, end in gbk_record_spans(buffer):
+        yield parse_gbk_record(buffer, rec_id, start, end, with_seq)
+
+def parse_gbk(gbk, with_seq=False, cache_dir=None, cache_size='5G'):
+    """
+    Lazily parses every record of a genbank file. The sequences are skipped unless with_seq is set.
+    With a cache_dir, parsed files are loaded from (or saved to) the cache instead.
+    """
+    if cache_dir:
+        yield from cached_records(gbk, cache_dir, cache_size)
+    else:
+        with mapped_file(gbk) as mm:
+            yield from parse_gbk_bytes(mm, with_seq)
+
+#####################################
+### Content-addressed parse cache ###
+#####################################
+def cache_key(gbk, cache_dir):
+    """
+    Identifies a parsed file by the hash of its content and the version of the parser. The key of
+    each path is kept in a small side file (<hash of the path>.key) along with the size and mtime
+    of the file, so unchanged files are not hashed again.
+    """
+    stat = os.stat(gbk)
+    signature = f"{stat.st_size} {stat.st_mtime_ns}"
+    pointer = os.path.join(cache_dir, f"{hashlib.sha256(os.path.abspath(gbk).encode()).hexdigest()}.key")
+    try:
+        with open(pointer) as f:
+            saved_signature, key = f.read().rsplit(' ', 1)
+        if saved_signature == signature:
+            return key
+    except (FileNotFoundError, ValueError):
+        pass
+    with mapped_file(gbk) as mm:
+        key = f"{hashlib.sha256(mm).hexdigest()}-v{parser_version}"
+    with atomic_output(pointer, 'w') as f:
+        f.write(f"{signature} {key}")
+    return key
+
+# each cached record is the length of its JSON metadata and of its sequence, then both
+cache_lengths = struct.Struct('<QQ')
+
+def dump_record(record):
+    """
+    Serializes a parsed record compactly: its offsets, and the type, location, offset, flat parts
+    and qualifiers of each feature as JSON, followed by the raw sequence bytes. Raw feature blocks
+    are not kept.
+    """
+    metadata = json.dumps([
+        record.id, record.name, record.length, record.offset, record.features_offset, record.tail_offset, record.end_offset,
+        record.seq is not None, [[feature.type, feature.location, feature.offset, [value for part in feature.parts for value in part], feature.qualifiers]
+         for feature in record.features]
+    ], separators=(',', ':')).encode()
+    seq = record.seq or b''
+    return cache_lengths.pack(len(metadata), len(seq)) + metadata + seq
+
+def load_records(handle):
+    """
+    Lazily reads back the records saved with dump_record from an open (binary) cache entry.
+    """
+    while True:
+        lengths = handle.read(cache_lengths.size)
+        if len(lengths) < cache_lengths.size:
+            return
+        metadata_length, seq_length = cache_lengths.unpack(lengths)
+        rec_id, name, length, offset, features_offset, tail_offset, end_offset, with_seq, features = json.loads(handle.read(metadata_length))
+        seq = handle.read(seq_length) if with_seq else None
+        parsed = []
+        for type, location, feature_offset, parts, qualifiers in features:
+            feature = GbkFeature(type, location, feature_offset, None)
+            feature._parts = [tuple(parts[i:i + 3]) for i in range(0, len(parts), 3)]
+            feature._qualifiers = qualifiers
+            parsed.append(feature)
+        yield GbkRecord(rec_id, name, length, offset, features_offset, tail_offset, end_offset, parsed, seq)
+
+def cached_records(gbk, cache_dir, cache_size='5G'):
+    """
+    Lazily yields the parsed records (with sequences) of a genbank file from the cache, parsing and
+    caching them, one at a time, on a miss. Entries are evicted, least recently used first, above
+    cache_size. Cached features have their location and qualifiers decoded, but no raw block
+    (their block is None).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, f"{cache_key(gbk, cache_dir)}.gbc")
+    try:
+        with open(entry, 'rb') as f:
+            os.utime(entry)
+            yield from load_records(f)
+        return
+    except FileNotFoundError:
+        pass
+
+    # written aside and moved, so concurrent runs never read partial entries
+    with atomic_output(entry) as f, mapped_file(gbk) as mm:
+        for record in parse_gbk_bytes(mm, with_seq=True):
+            f.write(dump_record(record))
+            yield record
+    evict_cache(cache_dir, parse_size(cache_size), keep=entry)
+
+def evict_cache(cache_dir, max_size, keep=None):
+    """
+    Removes the least recently used entries until the cache fits in max_size, never the entry to keep
+    (the one just written).
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.gbc') and entry.path != keep:
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries) + (os.path.getsize(keep) if keep else 0)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
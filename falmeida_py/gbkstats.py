@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_gbkstats = """
+A script meant to quickly summarize (QC) many genbank files without fully parsing them.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py gbkstats [ -h|--help ]
+    falmeida-py gbkstats [ --gbk <genbank> --out <tsv> --jobs <int> ]
+
+Options:
+    -h --help                      Show this screen.
+    -g --gbk=<genbank>             Genbank file, directory, (quoted) glob pattern or file listing one genbank path per line.
+    -o --out=<tsv>                 TSV output file [Default: stdout].
+    -j --jobs=<int>                Number of genbank files scanned in parallel [Default: 1].
+
+Comments:
+    The TSV has one line per genbank file with the columns: file, records, length, gc (percentage
+    of G+C among the A, C, G and T bases), cds_missing_translation, cds_missing_locus_tag and the
+    number of features of each type.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import sys
+import re
+from .gbkparser import seq_delete, locus_length
+from .utils import find_gbk_files, mapped_file, gbk_record_spans
+
+######################
+### Scan a genbank ###
+######################
+# feature keys start at column 5 of the FEATURES section
+feature_key = re.compile(rb'^ {5}(\S+)', re.M)
+
+def gbk_stats(genbank):
+    """
+    Summarizes a genbank file with byte-level scans of its FEATURES and ORIGIN sections.
+    """
+    stats = {"file": genbank, "records": 0, "length": 0, "gc": 0, "cds_missing_translation": 0, "cds_missing_locus_tag": 0}
+    features, gc, acgt = {}, 0, 0
+    with mapped_file(genbank) as mm:
+        for _, start, end in gbk_record_spans(mm):
+            stats["records"] += 1
+            origin = mm.rfind(b'\nORIGIN', start, end)
+            origin = end if origin == -1 else origin + 1
+
+            # each feature block lasts until the next feature key
+            features_offset = mm.find(b'\nFEATURES', start, origin)
+            section = b'' if features_offset == -1 else mm[features_offset + 1:origin]
+            keys = [(match.start(), match.group(1)) for match in feature_key.finditer(section)]
+            for (block_start, key), (block_end, _) in zip(keys, keys[1:] + [(len(section), None)]):
+                key = key.decode()
+                features[key] = features.get(key, 0) + 1
+                if key == "CDS":
+                    stats["cds_missing_translation"] += section.find(b'/translation=', block_start, block_end) == -1
+                    stats["cds_missing_locus_tag"] += section.find(b'/locus_tag=', block_start, block_end) == -1
+
+            # records without sequence count their LOCUS length
+            if origin == end:
+                locus = mm[start:mm.find(b'\n', start, end)].split()
+                stats["length"] += locus_length(locus) or 0
+                continue
+
+            # bases are counted by deleting them, which is faster than counting each one
+            seq = mm[mm.find(b'\n', origin, end) + 1:end].translate(None, seq_delete)
+            stats["length"] += len(seq)
+            gc += len(seq) - len(seq.translate(None, b'GCgc'))
+            acgt += len(seq) - len(seq.translate(None, b'ACGTacgt'))
+    stats["gc"] = round(100 * gc / max(1, acgt), 2)
+    return {**stats, **features}
+
+#####################
+### main function ###
+#####################
+def gbkstats(genbanks, out='stdout', jobs=1):
+    genbanks = find_gbk_files(genbanks)
+    with ProcessPoolExecutor(max_workers=int(jobs)) as pool:
+        stats = pd.DataFrame(list(pool.map(gbk_stats, genbanks, chunksize=16)))
+    # files lacking a feature type have none of it
+    stats = stats.fillna(0).astype({column: int for column in stats.columns if column not in ("file", "gc")})
+    stats.to_csv(sys.stdout if out == 'stdout' else out, sep='\t', index=False)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_indexgbk = """
+A script meant to index the CDSs of many genbank files by locus_tag, for instant retrieval with gbk2fasta --index.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py indexgbk [ -h|--help ]
+    falmeida-py indexgbk [ --gbk <genbank> --index <db> --jobs <int> ]
+
+Options:
+    -h --help                      Show this screen.
+    -g --gbk=<genbank>             Genbank file, directory, (quoted) glob pattern or file listing one genbank path per line.
+    -i --index=<db>                SQLite index to create or update [Default: genes.sqlite].
+    -j --jobs=<int>                Number of genbank files indexed in parallel [Default: 1].
+
+Comments:
+    For each CDS the index saves its locus_tag, file, record byte offset and length, location, product
+    and the byte offset of its translation. Files already indexed are only re-scanned when their size
+    or modification time changed, and files indexed before but not given anymore are dropped from the
+    index. Genes can then be retrieved with:
+        falmeida-py gbk2fasta --index <db> --fofn <file> [ --type <type> --out <fasta> ]
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from concurrent.futures import ProcessPoolExecutor
+import sqlite3
+import os
+from .gbkparser import parse_gbk, parse_gbk_bytes
+from .gbk2fasta import load_gene_list, extract_nucl, translate, five_prime_partial, write_sequences, dedup_sequences
+from .utils import find_gbk_files, open_output
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime REAL
+);
+CREATE TABLE IF NOT EXISTS genes (
+    locus_tag TEXT, file_id INTEGER, record_id TEXT, record_offset INTEGER, record_length INTEGER,
+    location TEXT, product TEXT, codon_start INTEGER, transl_table TEXT,
+    translation_offset INTEGER, translation_length INTEGER
+);
+CREATE INDEX IF NOT EXISTS genes_locus_tag ON genes (locus_tag);
+"""
+
+###############################
+### Scan a genbank for CDSs ###
+###############################
+def translation_span(feature):
+    """
+    Returns the (offset, length) in the file of the quoted translation value of a feature.
+    """
+    assert feature.block is not None, "features loaded from the parse cache have no raw bytes"
+    start = feature.block.find(b'/translation="')
+    if start == -1:
+        return None, None
+    start += len(b'/translation="')
+    end = feature.block.find(b'"', start)
+    return feature.offset + start, end - start
+
+def index_rows(genbank):
+    rows = []
+    for record in parse_gbk(genbank):
+        for feature in record.features:
+            if feature.type != "CDS" or 'locus_tag' not in feature.qualifiers:
+                continue
+            rows.append((
+                feature.get('locus_tag'), record.id, record.offset, record.end_offset - record.offset,
+                feature.location, feature.get('product'), int(feature.get('codon_start', 1)),
+                feature.get('transl_table', '11'), *translation_span(feature)
+            ))
+    return rows
+
+######################
+### Build / update ###
+######################
+def indexgbk(genbanks, db, jobs=1):
+    genbanks = [os.path.abspath(genbank) for genbank in find_gbk_files(genbanks)]
+    con = sqlite3.connect(db)
+    con.executescript(schema)
+
+    # only (re-)scan new or modified files
+    known = {path: (size, mtime) for path, size, mtime in con.execute("SELECT path, size, mtime FROM files")}
+    stale = [genbank for genbank in genbanks if known.get(genbank) != (os.path.getsize(genbank), os.path.getmtime(genbank))]
+
+    # drop the files indexed before but not given now, so the index mirrors the scanned files
+    dropped = [(path,) for path in known.keys() - set(genbanks)]
+    with con:
+        con.executemany("DELETE FROM genes WHERE file_id IN (SELECT file_id FROM files WHERE path = ?)", dropped)
+        con.executemany("DELETE FROM files WHERE path = ?", dropped)
+
+    with ProcessPoolExecutor(max_workers=int(jobs)) as pool:
+        for genbank, rows in zip(stale, pool.map(index_rows, stale)):
+            with con:
+                con.execute("DELETE FROM genes WHERE file_id IN (SELECT file_id FROM files WHERE path = ?)", (genbank,))
+                con.execute("DELETE FROM files WHERE path = ?", (genbank,))
+                file_id = con.execute(
+                    "INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)",
+                    (genbank, os.path.getsize(genbank), os.path.getmtime(genbank))
+                ).lastrowid
+                con.executemany(
+                    "INSERT INTO genes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(row[0], file_id, *row[1:]) for row in rows]
+                )
+    con.close()
+    print(f"Done!\nIndexed {len(stale)} new or modified file(s) out of {len(genbanks)}, dropped {len(dropped)} file(s) no longer given, at: {db}")
+
+#################################
+### Retrieve genes from index ###
+#################################
+def indexed_cds_sequences(db, genes, seq_type):
+    """
+    Returns an iterator over the (header, sequence) of the indexed CDSs with the given locus_tags.
+    The genbank files holding them are first checked to be unchanged since they were indexed.
+    """
+    if not os.path.isfile(db):
+        raise ValueError(f"The index {db} does not exist, please create it with indexgbk.")
+    con = sqlite3.connect(db)
+    con.execute("CREATE TEMP TABLE wanted (locus_tag TEXT PRIMARY KEY)")
+    con.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((gene,) for gene in genes))
+    hits = con.execute("""
+        SELECT genes.locus_tag, path, record_offset, record_length, location, product,
+               codon_start, transl_table, translation_offset, translation_length
+        FROM wanted JOIN genes USING (locus_tag) JOIN files USING (file_id)
+        ORDER BY path, record_offset, translation_offset
+    """).fetchall()
+    files = con.execute("SELECT path, size, mtime FROM files WHERE file_id IN (SELECT file_id FROM wanted JOIN genes USING (locus_tag))").fetchall()
+    con.close()
+
+    # offsets are only valid for the files as they were indexed
+    changed = [path for path, size, mtime in files if not os.path.isfile(path) or (os.path.getsize(path), os.path.getmtime(path)) != (size, mtime)]
+    if changed:
+        raise ValueError(f"Genbank files were modified or removed since they were indexed, please update the index {db} with indexgbk: {', '.join(changed)}")
+    return read_indexed_cds(hits, seq_type)
+
+def read_indexed_cds(hits, seq_type):
+    """
+    Yields the (header, sequence) of the CDSs found in the index, reading only their translation
+    (or their record, for nucleotides and missing translations) from disk.
+    """
+    handles, record = {}, (None, None)
+    try:
+        for locus_tag, path, rec_offset, rec_length, location, product, codon_start, transl_table, tr_offset, tr_length in hits:
+            header = f"{locus_tag} {product}" if product else locus_tag
+            handle = handles.get(path) or handles.setdefault(path, open(path, 'rb'))
+            if seq_type == 'prot' and tr_offset is not None:
+                handle.seek(tr_offset)
+                yield header, handle.read(tr_length).translate(None, b' \r\n')
+                continue
+            # features of the same record are sorted together, so it is parsed only once
+            if record[0] != (path, rec_offset):
+                handle.seek(rec_offset)
+                record = ((path, rec_offset), next(parse_gbk_bytes(handle.read(rec_length), with_seq=True)))
+            feature = next(feature for feature in record[1].features if feature.type == "CDS" and feature.location == location and feature.get('locus_tag') == locus_tag)
+            nucl = extract_nucl(record[1].seq, feature.parts)
+            yield header, nucl if seq_type == 'nucl' else translate(nucl[codon_start - 1:], transl_table, codon_start == 1 and not five_prime_partial(feature))
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+def convertindex(db, genes_list, out='stdout', seq_type='prot', dedup=None):
+    """
+    Writes the CDSs listed in genes_list to a fasta, retrieving them from an indexgbk index.
+    """
+    sequences = indexed_cds_sequences(db, load_gene_list(genes_list), seq_type)
+    with open_output(out) as handle:
+        if dedup:
+            with open(dedup, 'wb', buffering=1 << 20) as mapping:
+                write_sequences(handle, dedup_sequences(sequences, mapping, {}))
+        else:
+            write_sequences(handle, sequences)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_maskfasta = """
+A script meant to soft-mask (lowercase) or hard-mask (N) the intervals of a BED file in a FASTA file.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py maskfasta [ -h|--help ]
+    falmeida-py maskfasta [ --fasta <fasta> --bed <bed> --out <out_fasta> --hard ]
+
+Options:
+    -h --help                      Show this screen.
+    -f --fasta=<fasta>             FASTA file to mask.
+    -b --bed=<bed>                 BED file (start 0-based) with the intervals to mask.
+    -o --out=<out_fasta>           Output FASTA file [Default: out.fasta].
+    --hard                         Hard-mask (replace with N) instead of soft-masking (lowercase).
+
+Comments:
+    The FASTA is masked one record at a time and keeps its line wrapping. Intervals may overlap and
+    are clipped at the contig ends.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+import numpy as np
+import sys
+from .fastaindex import fai_entry, load_intervals
+from .utils import mapped_file, fasta_record_spans
+
+# masked byte of every byte, line breaks are always kept
+soft_mask = np.frombuffer(bytes(range(256)).lower(), dtype=np.uint8)
+hard_mask = np.full(256, ord('N'), dtype=np.uint8)
+hard_mask[[ord('\n'), ord('\r')]] = [ord('\n'), ord('\r')]
+
+###########################
+### Merge the intervals ###
+###########################
+def merge_intervals(starts, ends):
+    """
+    Merges overlapping (or touching) intervals given as numpy arrays, returning them sorted and disjoint.
+    """
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    # an interval starts a new group when it begins after every previous one ended
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > ends[:-1]
+    last = np.append(first[1:], True)
+    return starts[first], ends[last]
+
+#####################
+### Mask a contig ###
+#####################
+def mask_sequence(seq, starts, ends, table):
+    """
+    Masks the [starts, ends) byte intervals of a sequence (numpy uint8 array) in place, with a
+    mask built from the cumulative sum of the interval boundaries.
+    """
+    if not len(starts):
+        return
+    starts, ends = merge_intervals(starts, ends)
+    boundaries = np.zeros(len(seq) + 1, dtype=np.int8)
+    boundaries[starts] += 1
+    boundaries[ends] -= 1
+    mask = np.cumsum(boundaries[:-1], dtype=np.int8).astype(bool)
+    seq[mask] = table[seq[mask]]
+
+def mask_record(mm, contig, seq_start, end, intervals, table):
+    """
+    Returns the masked sequence lines of a record. Base coordinates are converted to byte offsets
+    with the line layout (as in a .fai index), or the sequence is unwrapped when it has none.
+    """
+    starts = np.array([start for start, _, _, _ in intervals], dtype=np.int64)
+    ends = np.array([end for _, end, _, _ in intervals], dtype=np.int64)
+    try:
+        length, _, line_bases, line_width = fai_entry(mm, contig, seq_start, end)
+        seq = np.frombuffer(mm[seq_start:end], dtype=np.uint8).copy()
+        # empty sequences (no bases per line) keep no interval
+        starts, ends = np.clip(starts, 0, length), np.clip(ends, 0, length)
+        if line_bases:
+            starts = starts // line_bases * line_width + starts % line_bases
+            ends = ends // line_bases * line_width + ends % line_bases
+    except ValueError:
+        # sequences without a regular layout (ragged or starting with a blank line) are unwrapped
+        seq = np.frombuffer(mm[seq_start:end].translate(None, b'\r\n') + b'\n', dtype=np.uint8).copy()
+        starts, ends = np.clip(starts, 0, len(seq) - 1), np.clip(ends, 0, len(seq) - 1)
+    keep = starts < ends
+    mask_sequence(seq, starts[keep], ends[keep], table)
+    return seq.tobytes()
+
+#####################
+### main function ###
+#####################
+def maskfasta(fasta, bed, out, hard=False):
+    intervals = load_intervals(bed)
+    table = hard_mask if hard else soft_mask
+    found = set()
+    with mapped_file(fasta) as mm, open(out, 'wb', buffering=1 << 20) as f:
+        for contig, start, seq_start, end in fasta_record_spans(mm):
+            f.write(mm[start:seq_start])
+            if contig in intervals:
+                found.add(contig)
+                f.write(mask_record(mm, contig, seq_start, end, intervals[contig], table))
+            else:
+                f.write(mm[seq_start:end])
+    missing = [contig for contig in intervals if contig not in found]
+    if missing:
+        print(f"WARNING: contigs of the BED not found in the FASTA: {', '.join(missing)}", file=sys.stderr)
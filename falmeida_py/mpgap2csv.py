@@ -18,6 +18,10 @@ Options:
     -h --help                   Show this screen.
     --input=<indir>             Path to MpGAP outdir.
     --output=<outfile>          File to save results (CSV). [Default: MpGAP_summary.csv]
+
+Comments:
+    Assemblies without multiqc results (e.g. when quast was not executed) are summarized from their
+    final_assemblies files instead, with the seqstats command statistics (# contigs, N50 and Total length).
 """
 
 ##################################
@@ -29,6 +33,8 @@ import os
 from pathlib import Path
 import json
 from pprint import pprint
+from .seqstats import seqstats_table
+from .utils import fasta_extensions
 
 ###################################
 ### Defifining useful functions ###
@@ -48,6 +54,22 @@ def split_and_retrieve_desired_values(item):
     
     return sample, method, outdir
 
+def find_final_assemblies(dir):
+    matches = []
+    for path in sorted(Path(dir).rglob('final_assemblies')):
+        for file in sorted(path.iterdir()):
+            if file.suffix.lower() in fasta_extensions:
+                matches.append(os.path.abspath(file.resolve()))
+    return matches
+
+def split_assembly_path(item):
+    values=str(item).split('/')
+    sample=values[-4]
+    method=values[-3]
+    outdir='/'.join(values[:-4])
+
+    return sample, method, outdir
+
 def parse_json(data, assembler, field, item):
     
     return data['report_saved_raw_data'][field][assembler][item]
@@ -87,7 +109,21 @@ def get_sample_and_assembly_info(files, df, quast_cols, busco_cols, base_columns
                 df.loc[len(df)] = final
                 # print(final)
         
-             
+
+def get_assembly_stats(files, df):
+    # native statistics, only for samples and methods lacking multiqc results
+    done = set(zip(df['sample'], df['method']))
+    files = [item for item in files if split_assembly_path(item)[:2] not in done]
+    stats = seqstats_table(files)
+
+    for item, row in zip(files, stats.to_dict('records')):
+        sample, method, outdir = split_assembly_path(item)
+        final = dict.fromkeys(df.columns)
+        final.update({
+            "sample": sample, "method": method, "outdir": outdir, "software": Path(item).stem,
+            "# contigs": row["# contigs"], "N50": row["N50"], "Total length": row["Total length"]
+        })
+        df.loc[len(df)] = [final[column] for column in df.columns]
 
 ####################
 ## Defining main ###
@@ -113,6 +149,7 @@ def mpgap2csv(indir, output):
         desired_busco_columns,
         base_columns
     )
+    get_assembly_stats(find_final_assemblies(indir), multiqc_files_df)
 
     # save file
     multiqc_files_df.to_csv(output, index=False)
@@ -13,23 +13,38 @@ License: Public Domain
 
 Usage:
     falmeida-py replace_fasta_seq [ -h|--help ]
-    falmeida-py replace_fasta_seq [ --fasta <fasta> --bed <bed> --out <out_fasta>  ]
+    falmeida-py replace_fasta_seq [ --fasta <fasta> --bed <bed> --out <out_fasta> --stream ]
+    falmeida-py replace_fasta_seq [ --fasta <fasta> --manifest <tsv> --jobs <int> ]
 
 Options:
     -h --help                      Show this screen.
     -f --fasta=<fasta>             FASTA file to replace sequences in.
     -o --out=<out_fasta>           Output FASTA file [Default: out.fasta].
     -b --bed=<bed>                 BED file with replacement definitions.
+    -s --stream                    Edit the FASTA one record at a time, holding at most one contig in memory.
+                                   Contigs without edits are copied as they are (with their line wrapping).
+    -m --manifest=<tsv>            Batch mode: tab-separated file with one 'bed output_fasta' pair per line, to write
+                                   many edited copies of the FASTA, which is read only once.
+    -j --jobs=<int>                Number of edited copies written in parallel in batch mode [Default: 1].
 
 Comments:
     The BED (start 0-based) file MUST be a 4 column file with the following format:
         contig start end sub_seq
+
+    All coordinates refer to the original FASTA, so edits may be given in any order, but they
+    must not overlap. Insertions are given with start == end and deletions with an empty sub_seq.
+    The new coordinates of each edit are saved alongside the output as <out_fasta>.offsets.tsv.
+
+    In batch mode, the FASTA is loaded once and shared (copy-on-write) by forked worker processes,
+    so it is not copied for each edit set.
 """
 
 ##################################
 ### Loading Necessary Packages ###
 ##################################
 from Bio import SeqIO
+import multiprocessing
+from .utils import mapped_file, fasta_record_spans
 
 ##########################
 ### load fasta as dict ###
@@ -37,31 +52,177 @@ from Bio import SeqIO
 def fasta_as_dict(fasta):
     fasta_dict = {}
     for seq_record in SeqIO.parse(fasta, "fasta"):
-        fasta_dict[seq_record.id] = seq_record
+        fasta_dict[seq_record.id] = bytes(seq_record.seq)
     return fasta_dict
 
+####################################
+### load and check the bed edits ###
+####################################
+def load_edits(bed):
+    """
+    Loads the edits of a BED file grouped per contig as sorted (start, end, sub_seq) lists,
+    checking each line and, with a sweep, that no two edits of a contig overlap.
+    """
+    edits = {}
+    with open(bed) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            if len(fields) != 4:
+                raise ValueError(f"Line {n} of the BED {bed} must have 4 tab-separated fields (contig start end sub_seq): {line.rstrip()}")
+            contig, start, end, sub_seq = fields
+            try:
+                start, end = int(start), int(end)
+            except ValueError:
+                raise ValueError(f"Line {n} of the BED {bed} has non-integer coordinates: {line.rstrip()}") from None
+            if start < 0:
+                raise ValueError(f"The edit {contig}:{start}-{end} starts before the contig (line {n} of the BED {bed}).")
+            edits.setdefault(contig, []).append((start, end, sub_seq.encode()))
+    for contig, contig_edits in edits.items():
+        # sorting is stable, so insertions at the same position keep their BED order
+        contig_edits.sort(key=lambda edit: (edit[0], edit[1]))
+        last = None
+        for edit in contig_edits:
+            if edit[0] > edit[1]:
+                raise ValueError(f"The edit {contig}:{edit[0]}-{edit[1]} ends before it starts.")
+            if last and edit[0] < last[1]:
+                raise ValueError(f"The edits {contig}:{last[0]}-{last[1]} and {contig}:{edit[0]}-{edit[1]} overlap.")
+            last = edit
+    return edits
+
 #############################################
 ### replace sequences using values in bed ###
 #############################################
-def replace_seq_in_dict(bed, dict):
-    with open(bed) as f:
-        for line in f:
-            contig, start, end, sub_seq = line.strip().split('\t')
-            dict[contig].seq = dict[contig].seq[:int(start)] + sub_seq + dict[contig].seq[int(end):]
+def apply_edits(seq, edits):
+    """
+    Applies sorted, non-overlapping edits (with coordinates on the original sequence) in a single
+    pass into a preallocated bytearray. Returns it with the new (start, end) of each edit.
+    """
+    out = bytearray(len(seq) + sum(len(sub_seq) - (end - start) for start, end, sub_seq in edits))
+    view, last, pos, offsets = memoryview(seq), 0, 0, []
+    for start, end, sub_seq in edits:
+        # unchanged stretch, then the replacement
+        out[pos:pos + start - last] = view[last:start]
+        pos += start - last
+        out[pos:pos + len(sub_seq)] = sub_seq
+        offsets.append((pos, pos + len(sub_seq)))
+        pos, last = pos + len(sub_seq), end
+    out[pos:] = view[last:]
+    return out, offsets
+
+def edit_contig(contig, seq, contig_edits, offsets):
+    """
+    Applies the edits of a contig, saving their new coordinates to the (open) offsets file.
+    """
+    if contig_edits[-1][1] > len(seq):
+        raise ValueError(f"The edit {contig}:{contig_edits[-1][0]}-{contig_edits[-1][1]} ends after the contig ({len(seq)} bp).")
+    new_seq, new_coords = apply_edits(seq, contig_edits)
+    for (start, end, _), (new_start, new_end) in zip(contig_edits, new_coords):
+        print(contig, start, end, new_start, new_end, sep='\t', file=offsets)
+    return new_seq
+
+def check_contigs(edits, contigs):
+    missing = [contig for contig in edits if contig not in contigs]
+    if missing:
+        raise ValueError(f"Contigs of the BED not found in the FASTA: {', '.join(missing)}")
+
+def replace_seq_in_dict(bed, dict, offsets_file):
+    edits = load_edits(bed)
+    check_contigs(edits, dict)
+    with open(offsets_file, 'w') as offsets:
+        print("contig", "start", "end", "new_start", "new_end", sep='\t', file=offsets)
+        for contig, contig_edits in edits.items():
+            dict[contig] = edit_contig(contig, dict[contig], contig_edits, offsets)
 
 ####################
 ### output fasta ###
 ####################
 def output_fasta(dict, out):
-    with open(out, 'w') as f:
-        for record in dict.values():
-            print(">" + record.id, file=f)
-            print(record.seq, file=f)
+    with open(out, 'wb', buffering=1 << 20) as f:
+        for contig, seq in dict.items():
+            f.write(b'>' + contig.encode() + b'\n')
+            f.write(seq)
+            f.write(b'\n')
+
+##########################
+### streaming function ###
+##########################
+def replace_fasta_seq_stream(input, output, bed):
+    """
+    Edits a FASTA one record at a time: records without edits are copied as raw bytes and
+    only the sequence of the record being edited is held in memory.
+    """
+    edits = load_edits(bed)
+    with mapped_file(input) as mm:
+        check_contigs(edits, set(contig for contig, _, _, _ in fasta_record_spans(mm)))
+        with open(output, 'wb', buffering=1 << 20) as f, open(f"{output}.offsets.tsv", 'w') as offsets:
+            print("contig", "start", "end", "new_start", "new_end", sep='\t', file=offsets)
+            for contig, start, seq_start, end in fasta_record_spans(mm):
+                if contig not in edits:
+                    f.write(mm[start:end])
+                    continue
+                seq = mm[seq_start:end].translate(None, b'\r\n')
+                f.write(mm[start:seq_start])
+                f.write(edit_contig(contig, seq, edits[contig], offsets))
+                f.write(b'\n')
+
+##################
+### batch mode ###
+##################
+# the reference, set before forking the workers so they all share its memory
+shared_reference = None
+
+def load_reference(fasta):
+    """
+    Loads the sequences of a FASTA as a dict of bytes, by id, with a single read.
+    """
+    with mapped_file(fasta) as mm:
+        return {contig: mm[seq_start:end].translate(None, b'\r\n') for contig, _, seq_start, end in fasta_record_spans(mm)}
+
+def write_haplotype(bed, output):
+    """
+    Worker function writing the shared reference edited with a BED. Returns a problem, if any.
+    """
+    try:
+        edits = load_edits(bed)
+        check_contigs(edits, shared_reference)
+        with open(output, 'wb', buffering=1 << 20) as f, open(f"{output}.offsets.tsv", 'w') as offsets:
+            print("contig", "start", "end", "new_start", "new_end", sep='\t', file=offsets)
+            for contig, seq in shared_reference.items():
+                f.write(b'>' + contig.encode() + b'\n')
+                f.write(edit_contig(contig, seq, edits[contig], offsets) if contig in edits else seq)
+                f.write(b'\n')
+    except (ValueError, OSError) as error:
+        return f"{bed}: {error}"
+
+def replace_fasta_seq_batch(input, manifest, jobs=1):
+    global shared_reference
+    pairs = []
+    with open(manifest) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip() or line.startswith('#'):
+                continue
+            pair = line.rstrip('\r\n').split('\t')[:2]
+            if len(pair) < 2 or not all(field.strip() for field in pair):
+                raise ValueError(f"Line {n} of the manifest {manifest} must have a BED file and an output FASTA, separated by a tab: {line.rstrip()}")
+            pairs.append(pair)
+    shared_reference = load_reference(input)
+    try:
+        with multiprocessing.get_context('fork').Pool(int(jobs)) as pool:
+            problems = [problem for problem in pool.starmap(write_haplotype, pairs, chunksize=1) if problem]
+    finally:
+        shared_reference = None
+    if problems:
+        raise ValueError('\n'.join(problems))
 
 #####################
 ### main function ###
 #####################
-def replace_fasta_seq(input, output, bed):
+def replace_fasta_seq(input, output, bed, stream=False):
+    if stream:
+        replace_fasta_seq_stream(input, output, bed)
+        return
     fasta_dict = fasta_as_dict(input)
-    replace_seq_in_dict(bed, fasta_dict)
+    replace_seq_in_dict(bed, fasta_dict, f"{output}.offsets.tsv")
     output_fasta(fasta_dict, output)
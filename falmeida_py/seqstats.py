@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+########################
+### Def help message ###
+########################
+usage_seqstats = """
+A script meant to quickly compute assembly statistics (contigs, length, N50, GC, ...) of many FASTA or genbank files.
+
+---
+Copyright (C) 2022 Felipe Marques de Almeida (almeidafmarques@gmail.com)
+License: Public Domain
+
+Usage:
+    falmeida-py seqstats [ -h|--help ]
+    falmeida-py seqstats [ --input <files> --output <outfile> --jobs <int> ]
+
+Options:
+    -h --help                      Show this screen.
+    -i --input=<files>             FASTA or genbank file, directory, (quoted) glob pattern or file listing one path per line.
+    -o --output=<outfile>          File to save results (CSV) [Default: stdout].
+    -j --jobs=<int>                Number of files processed in parallel [Default: 1].
+
+Comments:
+    The CSV has one line per file with the columns: file, # contigs, Total length, N50, N90, L50,
+    GC (%) (among the A, C, G and T bases) and # N's, named as in the mpgap2csv summaries.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+import sys
+from .gbkparser import seq_delete, locus_length
+from .utils import mapped_file, fasta_record_spans, gbk_record_spans, find_input_files, gbk_extensions, fasta_extensions, sniff_start
+
+stats_columns = ["file", "# contigs", "Total length", "N50", "N90", "L50", "GC (%)", "# N's"]
+
+####################################
+### Read the sequences of a file ###
+####################################
+def file_sequences(mm):
+    """
+    Yields the length and the raw sequence bytes of each record of a memory-mapped FASTA or genbank
+    file. Genbank records without sequence (e.g. CONTIG records) have their LOCUS length and no bytes.
+    """
+    if sniff_start(mm[:1 << 16]).startswith(b'LOCUS'):
+        for _, start, end in gbk_record_spans(mm):
+            origin = mm.rfind(b'\nORIGIN', start, end)
+            if origin == -1:
+                yield locus_length(mm[start:mm.find(b'\n', start, end)].split()) or 0, b''
+                continue
+            seq = mm[mm.find(b'\n', origin + 1, end) + 1:end].translate(None, seq_delete)
+            yield len(seq), seq
+    else:
+        for _, _, seq_start, end in fasta_record_spans(mm):
+            seq = mm[seq_start:end].translate(None, b' \t\r\n')
+            yield len(seq), seq
+
+#########################
+### Compute the stats ###
+#########################
+def nx_stats(lengths, total, fraction):
+    """
+    Returns the Nx and Lx of contig lengths sorted from the longest.
+    """
+    index = int(np.searchsorted(np.cumsum(lengths), total * fraction))
+    return int(lengths[index]), index + 1
+
+def seq_stats(file):
+    """
+    Computes the assembly statistics of a file, one sequence at a time, with byte-level counts.
+    """
+    lengths, gc, acgt, n = [], 0, 0, 0
+    with mapped_file(file) as mm:
+        for length, seq in file_sequences(mm):
+            lengths.append(length)
+            # bases are counted by deleting them
+            gc += len(seq) - len(seq.translate(None, b'GCgc'))
+            acgt += len(seq) - len(seq.translate(None, b'ACGTacgt'))
+            n += len(seq) - len(seq.translate(None, b'Nn'))
+    lengths = np.sort(np.array(lengths, dtype=np.int64))[::-1]
+    total = int(lengths.sum())
+    n50, l50 = nx_stats(lengths, total, 0.5) if total else (0, 0)
+    n90, _ = nx_stats(lengths, total, 0.9) if total else (0, 0)
+    return [file, len(lengths), total, n50, n90, l50, round(100 * gc / max(1, acgt), 2), n]
+
+def seqstats_table(files, jobs=1):
+    with ProcessPoolExecutor(max_workers=int(jobs)) as pool:
+        return pd.DataFrame(list(pool.map(seq_stats, files, chunksize=16)), columns=stats_columns)
+
+#####################
+### main function ###
+#####################
+def seqstats(input, output='stdout', jobs=1):
+    files = find_input_files(input, fasta_extensions + gbk_extensions, ('LOCUS', '>'))
+    seqstats_table(files, jobs).to_csv(sys.stdout if output == 'stdout' else output, index=False)
@@ -10,29 +10,161 @@ License: Public Domain
 usage:
     falmeida-py splitgbk
     falmeida-py splitgbk [ -h|--help ]
-    falmeida-py splitgbk [ --gbk <file> ] [ --outdir <outdir> ]
+    falmeida-py splitgbk [ --gbk <file> ] [ --outdir <outdir> ] [ --validate ] [ --archive <file> ]
+    falmeida-py splitgbk [ --gbk <file> ] [ --outdir <outdir> ] [ --records-per-chunk <int> | --bytes-per-chunk <size> ]
 
 options:
     -h --help                               Show this screen.
     -g --gbk=<file>                         Input genbank file to split into multiple individual files.
     -o --outdir=<outdir>                    Directory (must already exist) in which to write the splitted files [Default: ./].
+    --validate                              Parse and re-write each record with Biopython instead of copying
+                                            its raw bytes. Slower, but fails on malformed records.
+    -a --archive=<file>                     Instead of writing individual files, stream them (as <id>.gbk members) into
+                                            this archive: <file>.tar, <file>.tar.gz or <file>.zip.
+    -r --records-per-chunk=<int>            Instead of one file per record, write balanced chunk files with at most
+                                            this number of records each.
+    -b --bytes-per-chunk=<size>             Instead of one file per record, write balanced chunk files of at most about
+                                            this size each (e.g. 500K, 100M or 1G). Records are never split.
+
+Comments:
+    Chunks are written as chunk_0001.gbk, chunk_0002.gbk, ... along with a manifest.tsv file
+    listing the records (ids) of each chunk.
 """
 
 ##################################
 ### Loading Necessary Packages ###
 ##################################
 from Bio import SeqIO
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+import zipfile
+import tarfile
+import math
+import time
+import io
 import os
+from .utils import mapped_file, gbk_record_spans, parse_size
 
 ####################
 ### GBK splitter ###
 ####################
-def splitgbk(gbk, outdir):
+def splitgbk(gbk, outdir, validate=False):
     # just parse the dir
     if type(outdir) == list:
         outdir = outdir[0]
     # exec biopython
-    for rec in SeqIO.parse(gbk, "genbank"):
-        SeqIO.write([rec], open(os.path.basename(os.path.normpath(outdir)) + "/" + rec.id + ".gbk", "w"), "genbank")
+    if validate:
+        for rec in SeqIO.parse(gbk, "genbank"):
+            with open(os.path.join(outdir, rec.id + ".gbk"), "w") as out:
+                SeqIO.write([rec], out, "genbank")
+    # copy each record verbatim
+    else:
+        with mapped_file(gbk) as mm:
+            for rec_id, start, end in gbk_record_spans(mm):
+                with open(os.path.join(outdir, rec_id + ".gbk"), "wb") as out:
+                    out.write(mm[start:end])
     # finish
     print(f"Done!\nIndividual files have been written at: {outdir}")
+
+##########################
+### GBK split archiver ###
+##########################
+def gbk_records(gbk, validate=False):
+    """
+    Yields the id and the (raw or Biopython re-written) bytes of each record of a genbank file.
+    """
+    if validate:
+        for rec in SeqIO.parse(gbk, "genbank"):
+            out = io.StringIO()
+            SeqIO.write([rec], out, "genbank")
+            yield rec.id, out.getvalue().encode()
+    else:
+        with mapped_file(gbk) as mm:
+            for rec_id, start, end in gbk_record_spans(mm):
+                yield rec_id, mm[start:end]
+
+def open_archive(archive):
+    """
+    Opens a tar, tar.gz or zip archive for writing, returning it and a function adding a member.
+    """
+    if archive.endswith('.zip'):
+        zf = zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED)
+        return zf, zf.writestr
+    tf = tarfile.open(archive, 'w:gz' if archive.endswith(('.tar.gz', '.tgz')) else 'w')
+    def add_member(name, data):
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime = len(data), time.time()
+        tf.addfile(info, io.BytesIO(data))
+    return tf, add_member
+
+def splitgbk_archive(gbk, archive, validate=False, max_pending=64):
+    """
+    Streams the records of a genbank file into an archive. Compression and writing run in a
+    single-worker pool (archives are written sequentially) overlapped with the record scanning,
+    with at most max_pending records held in memory.
+    """
+    pending = BoundedSemaphore(max_pending)
+    def add(add_member, name, data):
+        try:
+            add_member(name, data)
+        finally:
+            pending.release()
+
+    out, add_member = open_archive(archive)
+    with out, ThreadPoolExecutor(max_workers=1) as pool:
+        futures = []
+        for rec_id, data in gbk_records(gbk, validate):
+            pending.acquire()
+            futures.append(pool.submit(add, add_member, f"{rec_id}.gbk", data))
+            # surface writing errors early and keep the list short
+            if len(futures) >= max_pending:
+                running = []
+                for future in futures:
+                    if future.done():
+                        future.result()
+                    else:
+                        running.append(future)
+                futures = running
+        for future in futures:
+            future.result()
+    # finish
+    print(f"Done!\nIndividual files have been written to the archive: {archive}")
+
+############################
+### GBK chunked splitter ###
+############################
+def chunk_spans(spans, records_per_chunk=None, bytes_per_chunk=None):
+    """
+    Groups consecutive record spans into balanced chunks, either by number of records or by size.
+    """
+    if not spans:
+        return []
+    if records_per_chunk:
+        n_chunks = math.ceil(len(spans) / int(records_per_chunk))
+        return [spans[i * len(spans) // n_chunks:(i + 1) * len(spans) // n_chunks] for i in range(n_chunks)]
+    # records go to the chunk holding their midpoint, with chunks of equal target size
+    total = sum(end - start for _, start, end in spans)
+    n_chunks = math.ceil(total / parse_size(bytes_per_chunk))
+    target, done, chunks = total / n_chunks, 0, [[] for _ in range(n_chunks)]
+    for span in spans:
+        length = span[2] - span[1]
+        chunks[min(n_chunks - 1, int((done + length / 2) / target))].append(span)
+        done += length
+    return [chunk for chunk in chunks if chunk]
+
+def splitgbk_chunks(gbk, outdir, records_per_chunk=None, bytes_per_chunk=None):
+    # just parse the dir
+    if type(outdir) == list:
+        outdir = outdir[0]
+    with mapped_file(gbk) as mm, open(os.path.join(outdir, "manifest.tsv"), "w") as manifest:
+        print("chunk", "record", sep="\t", file=manifest)
+        chunks = chunk_spans(list(gbk_record_spans(mm)), records_per_chunk, bytes_per_chunk)
+        for n, chunk in enumerate(chunks, 1):
+            name = f"chunk_{n:04d}.gbk"
+            # records of a chunk are consecutive, so they are copied at once
+            with open(os.path.join(outdir, name), "wb") as out:
+                out.write(mm[chunk[0][1]:chunk[-1][2]])
+            for rec_id, start, end in chunk:
+                print(name, rec_id, sep="\t", file=manifest)
+    # finish
+    print(f"Done!\n{len(chunks)} chunk files and their manifest.tsv have been written at: {outdir}")
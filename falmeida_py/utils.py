@@ -1,5 +1,11 @@
 from pathlib import Path
+from contextlib import contextmanager
 import pandas as pd
+import tempfile
+import mmap
+import glob
+import sys
+import os
 
 def find_files(start_dir, pattern):
     matches = []
@@ -7,6 +13,54 @@ def find_files(start_dir, pattern):
         matches.append(path.resolve())
     return matches
 
+gbk_extensions = ('.gbk', '.gb', '.gbf', '.gbff', '.genbank')
+fasta_extensions = ('.fasta', '.fa', '.fna', '.fas', '.fsa', '.contigs')
+
+def sniff_start(data):
+    """
+    Returns the first bytes of a file without a byte order mark and leading whitespace, to tell
+    its format apart.
+    """
+    return (data[3:] if data.startswith(b'\xef\xbb\xbf') else data).lstrip()
+
+def find_input_files(source, extensions, starts=('LOCUS',)):
+    """
+    Lists the files of a directory (by extension), matching a glob pattern, or listed one per line
+    in a file. A file starting as an input file (e.g. with LOCUS, after any byte order mark or blank
+    lines) is returned as the only input. Raises ValueError for anything else.
+    """
+    if os.path.isdir(source):
+        return sorted(str(path) for path in Path(source).iterdir() if path.suffix.lower() in extensions)
+    if any(char in source for char in '*?[') and not os.path.exists(source):
+        return sorted(glob.glob(source))
+    if not os.path.isfile(source):
+        raise ValueError(f"The input {source} is not a file, a directory or a glob pattern matching files.")
+    with open(source, 'rb') as f:
+        head = f.read(1 << 16)
+    if head[:2] == b'\x1f\x8b':
+        raise ValueError(f"The input {source} is gzip compressed, please decompress it first.")
+    if sniff_start(head).startswith(tuple(start.encode() for start in starts)):
+        return [source]
+
+    # otherwise, a file of file names
+    try:
+        with open(source) as f:
+            files = [line.strip() for line in f if line.strip()]
+    except UnicodeDecodeError:
+        raise ValueError(f"The input {source} neither starts with {' or '.join(starts)} nor lists (one per line) files.")
+    missing = [file for file in files if not os.path.isfile(file)]
+    if missing:
+        raise ValueError(
+            f"The input {source} does not start with {' or '.join(starts)}, and as a list of files, these were not found: {', '.join(missing[:5])}"
+        )
+    return files
+
+def find_gbk_files(source):
+    """
+    Lists the genbank files of a directory, glob pattern or file of file names (see find_input_files).
+    """
+    return find_input_files(source, gbk_extensions)
+
 def load_and_subset_gff(file, col, pattern):
     df = pd.read_csv(
         file, sep='\t', 
@@ -21,4 +75,118 @@ def load_and_subset_gff(file, col, pattern):
     df = df[filter]
     df.drop_duplicates(inplace=True)
 
-    return df
\ No newline at end of file
+    return df
+
+@contextmanager
+def mapped_file(file):
+    """
+    Opens a file as a read-only memory map (or an empty buffer, since empty files cannot be mapped).
+    """
+    with open(file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+def parse_size(size):
+    """
+    Converts sizes such as 1000, 500K, 100M or 1G into bytes.
+    """
+    size = str(size).strip().upper().rstrip('B')
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+@contextmanager
+def open_output(out, buffering=1 << 20):
+    """
+    Opens an output file for (buffered) binary writing, where 'stdout' means the standard output.
+    """
+    if out == 'stdout':
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+    else:
+        with open(out, 'wb', buffering=buffering) as handle:
+            yield handle
+
+@contextmanager
+def atomic_output(file, mode='wb'):
+    """
+    Writes a file aside, in the same directory, and moves it in place once complete, so that
+    concurrent readers never see it partially written. It gets the usual (umask) permissions.
+    """
+    handle = tempfile.NamedTemporaryFile(
+        mode, dir=os.path.dirname(os.path.abspath(file)), prefix=f".{os.path.basename(file)}.", suffix='.tmp', delete=False
+    )
+    try:
+        with handle:
+            yield handle
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(handle.name, 0o666 & ~umask)
+        os.replace(handle.name, file)
+    except BaseException:
+        if os.path.exists(handle.name):
+            os.remove(handle.name)
+        raise
+
+def gbk_record_id(header):
+    """
+    Resolves the id of a raw GenBank record header the same way Biopython does: the first
+    ACCESSION completed with the VERSION suffix, falling back to the LOCUS name.
+    """
+    name, accession, version = None, None, None
+    for line in header.splitlines():
+        if line.startswith(b'LOCUS'):
+            fields = line.split()
+            name = fields[1].decode() if len(fields) > 1 else ''
+        elif line.startswith(b'ACCESSION') and accession is None:
+            fields = line[9:].replace(b';', b' ').split()
+            accession = fields[0].decode() if fields else None
+        elif line.startswith(b'VERSION'):
+            fields = line[7:].split()
+            version = fields[0].decode() if fields else None
+    if version:
+        prefix, _, suffix = version.partition('.')
+        if version.count('.') != 1 or not suffix.isdigit():
+            return version
+        accession = accession or prefix
+        return accession if '.' in accession else f"{accession}.{suffix}"
+    return accession or name
+
+def gbk_record_spans(buffer):
+    """
+    Scans the raw bytes of a (multi-record) GenBank file and yields, for each record, its id and
+    the [start, end) byte span going from its LOCUS line up to and including its // line.
+    """
+    size = len(buffer)
+    start = buffer.find(b'LOCUS')
+    while start != -1:
+        end = buffer.find(b'\n//', start)
+        end = size if end == -1 else buffer.find(b'\n', end + 1)
+        end = size if end == -1 else end + 1
+        header_end = buffer.find(b'\nFEATURES', start, end)
+        if header_end == -1:
+            header_end = buffer.find(b'\nORIGIN', start, end)
+        yield gbk_record_id(buffer[start:end if header_end == -1 else header_end]), start, end
+        start = buffer.find(b'LOCUS', end)
+
+def fasta_record_spans(buffer):
+    """
+    Scans the raw bytes of a (multi-record) FASTA file and yields, for each record, its id (the
+    first word of the header), the offset of its '>' line, the offset of its sequence lines and
+    the end of the record.
+    """
+    size = len(buffer)
+    start = 0 if buffer[:1] == b'>' else buffer.find(b'\n>')
+    start = start if start <= 0 else start + 1
+    while start != -1 and start < size:
+        seq_start = buffer.find(b'\n', start)
+        seq_start = size if seq_start == -1 else seq_start + 1
+        end = buffer.find(b'\n>', seq_start - 1)
+        end = size if end == -1 else end + 1
+        fields = buffer[start + 1:seq_start].split(None, 1)
+        yield (fields[0].decode() if fields else ''), start, seq_start, end
+        start = end
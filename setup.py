@@ -42,6 +42,7 @@ setup(
     license='GPLv3',
     packages=['falmeida_py'],
     install_requires=required,
+    extras_require={'table': ['pyarrow']},
     entry_points={"console_scripts": ['falmeida-py = falmeida_py.__main__:main']},
     include_package_data=True,
     zip_safe=False,